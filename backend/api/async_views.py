@@ -0,0 +1,332 @@
+"""Асинхронные представления для частых GET-запросов (ASYNC_VIEWS).
+
+Под ASGI-сервером (uvicorn) эти представления не занимают поток на время
+запросов к БД: аутентификация, валидаторы для условных GET, COUNT(*) и
+выборка страницы идут через асинхронный API ORM. Логика запросов,
+сериализаторы и пагинация берутся у обычных ViewSet из api.views, поэтому
+ответы совпадают байт в байт.
+
+Всё остальное (запись, HEAD, пагинация по курсору, browsable API) отдаётся
+синхронным представлениям DRF в потоке через sync_to_async.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.paginator import InvalidPage
+from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from functools import wraps
+from rest_framework import exceptions
+from rest_framework.authentication import get_authorization_header
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.views import exception_handler
+from urllib.parse import urljoin
+
+from foodgram import db_routing
+from foodgram.models import Recipe
+
+from . import ingredient_catalog, response_cache, short_codes
+from .authentication import aauthenticate_credentials
+from .conditional import aget_user_state, not_modified, set_validators
+from .pagination import KeysetPagination
+from .views import (
+    IngredientViewSet,
+    NameSearchFilter,
+    RecipeViewSet,
+    ShortLinkRedirect,
+    SubscriptionViewSet,
+)
+
+
+def async_read_view(fallback):
+    """GET обрабатывает асинхронная функция, остальные запросы - fallback
+    (синхронное представление) в потоке. Функция может вернуть None, чтобы
+    тоже отдать запрос fallback."""
+    sync_fallback = sync_to_async(fallback)
+    allow = ', '.join(get_allowed_methods(fallback))
+
+    def decorator(handler):
+        @csrf_exempt
+        @wraps(handler)
+        async def view(request, *args, **kwargs):
+            if request.method != 'GET' or wants_browsable_api(request):
+                return await sync_fallback(request, *args, **kwargs)
+            try:
+                with db_routing.read_scope():
+                    response = await handler(request, *args, **kwargs)
+            except (exceptions.APIException, Http404) as exc:
+                response = error_response(exc)
+            if response is None:
+                return await sync_fallback(request, *args, **kwargs)
+            # Заголовки, которые добавляет APIView.finalize_response
+            patch_vary_headers(response, ['Accept'])
+            response['Allow'] = allow
+            return response
+        # Для замеров (api.instrumentation) - как у представления DRF
+        view.cls = fallback.cls
+        view.actions = getattr(fallback, 'actions', None)
+        return view
+
+    return decorator
+
+
+def get_allowed_methods(fallback) -> list[str]:
+    """Методы для заголовка Allow, как их видит представление DRF."""
+    view = fallback.cls(**fallback.initkwargs)
+    for method, action in getattr(fallback, 'actions', {}).items():
+        setattr(view, method, getattr(view, action))
+    if hasattr(view, 'get') and not hasattr(view, 'head'):
+        view.head = view.get
+    return view.allowed_methods
+
+
+def wants_browsable_api(request) -> bool:
+    return ('format' in request.GET
+            or 'text/html' in request.headers.get('Accept', ''))
+
+
+async def authenticate(request):
+    """То же, что CachedTokenAuthentication, но через асинхронный ORM."""
+    auth = get_authorization_header(request).split()
+    if not auth or auth[0].lower() != b'token':
+        return AnonymousUser()
+
+    if len(auth) == 1:
+        raise exceptions.AuthenticationFailed(
+            'Invalid token header. No credentials provided.')
+    if len(auth) > 2:
+        raise exceptions.AuthenticationFailed(
+            'Invalid token header. Token string should not contain spaces.')
+    try:
+        key = auth[1].decode()
+    except UnicodeError:
+        raise exceptions.AuthenticationFailed(
+            'Invalid token header. '
+            'Token string should not contain invalid characters.')
+
+    user, _ = await aauthenticate_credentials(key)
+    return user
+
+
+async def make_view(viewset_class, request, action: str, **kwargs):
+    """Экземпляр ViewSet, подготовленный так же, как это делает DRF, но
+    без синхронной аутентификации."""
+    drf_request = Request(request)
+    drf_request.user = await authenticate(request)
+    if action in getattr(viewset_class, 'replica_actions', ()):
+        await db_routing.aallow_replica_reads(drf_request.user)
+
+    view = viewset_class(
+        action=action,
+        basename=get_basename(viewset_class),
+        detail='pk' in kwargs,
+    )
+    view.request = drf_request
+    view.args = ()
+    view.kwargs = kwargs
+    view.format_kwarg = None
+    view.headers = {}
+    return view
+
+
+def get_basename(viewset_class) -> str:
+    # Как у routers.DefaultRouter: от этого зависят ключи кэша для анонимов
+    if viewset_class is SubscriptionViewSet:
+        return 'user-subscriptions'
+    return viewset_class.queryset.model._meta.object_name.lower()
+
+
+def render(data, status: int = 200) -> HttpResponse:
+    return HttpResponse(
+        JSONRenderer().render(data),
+        status=status,
+        content_type='application/json',
+    )
+
+
+def error_response(exc) -> HttpResponse:
+    if isinstance(exc, Http404):
+        exc = exceptions.NotFound(*exc.args)
+    if isinstance(exc, exceptions.AuthenticationFailed):
+        # Как APIView.handle_exception с TokenAuthentication
+        exc.auth_header = 'Token'
+    drf_response = exception_handler(exc, {})
+    response = render(drf_response.data, drf_response.status_code)
+    for name in ('WWW-Authenticate', 'Retry-After'):
+        if name in drf_response:
+            response[name] = drf_response[name]
+    return response
+
+
+async def get_anonymous_data(view, compute):
+    """Данные ответа из кэша для анонимов (AnonymousCacheMixin)."""
+    request = view.request
+    if request.user.is_authenticated:
+        return await compute()
+    # Одновременные промахи считают данные один раз, как и в синхронном
+    # AnonymousCacheMixin
+    return await response_cache.aget_or_compute(
+        view.get_anonymous_cache_key(request),
+        compute,
+        settings.ANONYMOUS_CACHE_TIMEOUT,
+    )
+
+
+async def get_anonymous_validators(view, compute):
+    """Валидаторы ответа, для анонимов - из кэша
+    (AnonymousCacheMixin.get_anonymous_validators)."""
+    request = view.request
+    if request.user.is_authenticated:
+        return await compute()
+    return await response_cache.aget_or_compute(
+        view.get_anonymous_validators_key(request),
+        compute,
+        settings.ANONYMOUS_CACHE_TIMEOUT,
+    )
+
+
+async def get_page_data(view, queryset):
+    """Страница queryset в том же виде, что у ListModelMixin.list."""
+    paginator = view.paginator
+    request = view.request
+    page_size = paginator.get_page_size(request)
+
+    django_paginator = paginator.django_paginator_class(queryset, page_size)
+    # count - cached_property с кэшем и оценкой планировщика (см.
+    # CachedCountPaginator); считаем его в потоке один раз
+    await sync_to_async(lambda: django_paginator.count)()
+    page_number = paginator.get_page_number(request, django_paginator)
+
+    def get_page():
+        # При оценке количества page() сам выбирает строки страницы
+        page = django_paginator.page(page_number)
+        page.object_list = list(page.object_list)
+        return page
+
+    try:
+        page = await sync_to_async(get_page)()
+    except InvalidPage as exc:
+        raise exceptions.NotFound(paginator.invalid_page_message.format(
+            page_number=page_number, message=str(exc)))
+
+    paginator.page = page
+    paginator.request = request
+    serializer = view.get_serializer(page.object_list, many=True)
+    return paginator.get_paginated_response(serializer.data).data
+
+
+def uses_cursor(request) -> bool:
+    return KeysetPagination.cursor_query_param in request.GET
+
+
+@async_read_view(RecipeViewSet.as_view(
+    {'get': 'list', 'post': 'create'},
+    basename='recipe', detail=False, suffix='List'))
+async def recipe_list(request):
+    if uses_cursor(request):
+        return None
+    view = await make_view(RecipeViewSet, request, 'list')
+    queryset = view.get_queryset()
+
+    async def compute_validators():
+        summary = await queryset.order_by().aaggregate(
+            **view.get_list_summary())
+        return view.make_list_validators(
+            view.request, summary, await aget_user_state(view.request.user))
+
+    etag, last_modified = await get_anonymous_validators(
+        view, compute_validators)
+    response = not_modified(request, etag, last_modified)
+    if response is None:
+        response = render(await get_anonymous_data(
+            view, lambda: get_page_data(view, queryset)))
+    set_validators(response, etag, last_modified)
+    return response
+
+
+@async_read_view(RecipeViewSet.as_view({
+    'get': 'retrieve',
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy',
+}, basename='recipe', detail=True, suffix='Instance'))
+async def recipe_detail(request, pk):
+    view = await make_view(RecipeViewSet, request, 'retrieve', pk=pk)
+
+    async def compute_validators():
+        query = view.get_object_query(Recipe.objects.all())
+        if query is None:
+            return None, None
+        dates = await query.values_list(
+            *view.retrieve_validator_fields).afirst()
+        if dates is None:
+            return None, None
+        return view.make_retrieve_validators(
+            view.request, dates, await aget_user_state(view.request.user))
+
+    etag, last_modified = await get_anonymous_validators(
+        view, compute_validators)
+    response = not_modified(request, etag, last_modified)
+    if response is None:
+        async def compute():
+            query = view.get_object_query(view.get_queryset())
+            if query is None:
+                raise Http404
+            recipe = await query.afirst()
+            if recipe is None:
+                # Как get_object_or_404 в GenericAPIView.get_object
+                raise Http404('No Recipe matches the given query.')
+            return view.get_serializer(recipe).data
+
+        response = render(await get_anonymous_data(view, compute))
+    set_validators(response, etag, last_modified)
+    return response
+
+
+@async_read_view(IngredientViewSet.as_view(
+    {'get': 'list'},
+    basename='ingredient', detail=False, suffix='List'))
+async def ingredient_list(request):
+    view = await make_view(IngredientViewSet, request, 'list')
+    catalog = ingredient_catalog.catalog
+
+    name = request.GET.get(NameSearchFilter.search_param)
+    if name is None:
+        return view.list_all(request, await catalog.arendered())
+
+    etag, last_modified = view.get_list_validators(view.request)
+    response = not_modified(request, etag, last_modified)
+    if response is None:
+        serializer = view.get_serializer(
+            await catalog.asearch(name), many=True)
+        response = render(serializer.data)
+    set_validators(response, etag, last_modified)
+    return response
+
+
+@async_read_view(SubscriptionViewSet.as_view(
+    {'get': 'list'},
+    basename='user-subscriptions', detail=False, suffix='List'))
+async def subscription_list(request):
+    if uses_cursor(request):
+        return None
+    view = await make_view(SubscriptionViewSet, request, 'list')
+    if not view.request.user.is_authenticated:
+        # Ответ для анонимов остаётся за синхронным представлением
+        return None
+    view.parse_query_params(view.request)
+
+    return render(await get_page_data(view, view.get_queryset()))
+
+
+@async_read_view(ShortLinkRedirect.as_view())
+async def short_link_redirect(request, id):
+    await authenticate(request)
+    destination = await short_codes.aresolve(id)
+    if destination is None:
+        raise Http404
+    short_codes.hit_counter.add(id)
+    base_uri = request.build_absolute_uri('/')
+    return HttpResponseRedirect(redirect_to=urljoin(base_uri, destination))
@@ -0,0 +1,130 @@
+"""Аутентификация по токену без запроса к БД на каждый запрос.
+
+Пользователь по токену кэшируется в памяти процесса на
+AUTH_TOKEN_LOCAL_CACHE_TIMEOUT секунд и в общем кэше Django на
+AUTH_TOKEN_CACHE_TIMEOUT секунд. Сигналы (api.signals) сбрасывают записи
+при удалении токена (выход через auth/token/logout) и при изменении или
+удалении пользователя. Кэш в памяти других воркеров сигнал не достаёт,
+поэтому его время жизни короткое. Кэш Django общий только с CACHE_DIR,
+поэтому несколько воркеров без него gunicorn.conf.py не запускает.
+"""
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+import copy
+import hashlib
+import threading
+import time
+
+from . import metrics
+
+
+class LocalTokenCache:
+    """Кэш токен -> пользователь в памяти процесса с TTL."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return None
+            expires_at, user = item
+            if expires_at < time.monotonic():
+                del self.items[key]
+                return None
+            self.items.move_to_end(key)
+        # Каждому запросу своя копия: представления меняют request.user
+        return copy.copy(user)
+
+    def set(self, key: str, user):
+        expires_at = time.monotonic() + settings.AUTH_TOKEN_LOCAL_CACHE_TIMEOUT
+        with self.lock:
+            self.items[key] = (expires_at, copy.copy(user))
+            self.items.move_to_end(key)
+            if len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+    def delete(self, key: str):
+        with self.lock:
+            self.items.pop(key, None)
+
+
+local_cache = LocalTokenCache(max_size=10_000)
+
+
+def cache_key(token_key: str) -> str:
+    # Сам токен в ключах кэша (и именах файлов FileBasedCache) не храним
+    digest = hashlib.sha256(token_key.encode()).hexdigest()
+    return f'auth-token:{digest}'
+
+
+def get_cached_user(token_key: str):
+    user = local_cache.get(token_key)
+    if user is None:
+        user = cache.get(cache_key(token_key))
+        metrics.record_cache('auth_token', hit=user is not None)
+        if user is not None:
+            local_cache.set(token_key, user)
+    return user
+
+
+async def aget_cached_user(token_key: str):
+    user = local_cache.get(token_key)
+    if user is None:
+        user = await cache.aget(cache_key(token_key))
+        metrics.record_cache('auth_token', hit=user is not None)
+        if user is not None:
+            local_cache.set(token_key, user)
+    return user
+
+
+def cache_user(token_key: str, user):
+    local_cache.set(token_key, user)
+    cache.set(cache_key(token_key), user, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+
+
+async def acache_user(token_key: str, user):
+    local_cache.set(token_key, user)
+    await cache.aset(
+        cache_key(token_key), user, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+
+
+def invalidate(token_keys):
+    token_keys = list(token_keys)
+    for key in token_keys:
+        local_cache.delete(key)
+    cache.delete_many([cache_key(x) for x in token_keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        user = get_cached_user(key)
+        if user is None:
+            user, _ = super().authenticate_credentials(key)
+            cache_user(key, user)
+        # request.auth - токен без обращения к БД
+        return user, Token(key=key, user=user)
+
+
+async def aauthenticate_credentials(key: str):
+    """authenticate_credentials для асинхронных представлений."""
+    user = await aget_cached_user(key)
+    if user is None:
+        try:
+            token = await Token.objects.select_related('user').aget(key=key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        user = token.user
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+        await acache_user(key, user)
+    return user, Token(key=key, user=user)
@@ -0,0 +1,128 @@
+"""Условные GET-запросы (ETag / Last-Modified).
+
+Валидаторы считаются дешёвыми запросами (агрегаты Max и Count, выборка
+одного поля) без сериализации, и при совпадении клиент получает
+304 Not Modified.
+
+Ответы зависят ещё и от текущего пользователя (is_favorited,
+is_in_shopping_cart, is_subscribed), поэтому в валидаторы входит состояние
+его избранного, корзины и подписок. Оно берётся из БД - из версии
+состояния пользователя (UserChangeState), которую сдвигает каждая запись
+о нём в журнале изменений (foodgram.changelog), - и одинаково во всех
+воркерах.
+"""
+from datetime import datetime
+from django.core.exceptions import ValidationError
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+import hashlib
+
+from foodgram.models import UserChangeState
+
+
+def get_user_state(user) -> tuple[int | None, datetime | None]:
+    """Версия и время последнего изменения избранного, корзины и подписок
+    пользователя (UserChangeState): один запрос по первичному ключу,
+    сколько бы записей ни было в журнале."""
+    if not user.is_authenticated:
+        return None, None
+    return UserChangeState.objects.filter(user=user).values_list(
+        'version', 'modified_at').first() or (None, None)
+
+
+async def aget_user_state(user) -> tuple[int | None, datetime | None]:
+    """get_user_state для асинхронных представлений."""
+    if not user.is_authenticated:
+        return None, None
+    return await UserChangeState.objects.filter(user=user).values_list(
+        'version', 'modified_at').afirst() or (None, None)
+
+
+def make_etag(*parts) -> str:
+    return quote_etag(hashlib.sha256(repr(parts).encode()).hexdigest()[:32])
+
+
+class ConditionalGetMixin:
+    """Добавляет ETag и Last-Modified к list и retrieve и отвечает 304, если
+    они совпадают с заголовками запроса.
+
+    Наследники реализуют get_list_validators и get_retrieve_validators,
+    которые возвращают пару (etag, last_modified); любой элемент может
+    быть None.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            request,
+            self.get_list_validators,
+            lambda: super(ConditionalGetMixin, self).list(
+                request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            request,
+            self.get_retrieve_validators,
+            lambda: super(ConditionalGetMixin, self).retrieve(
+                request, *args, **kwargs),
+        )
+
+    def get_list_validators(self, request):
+        return None, None
+
+    def get_retrieve_validators(self, request):
+        return None, None
+
+    def get_object_query(self, queryset):
+        """queryset, отфильтрованный по объекту из URL, или None, если
+        идентификатор некорректен (тогда 404 ответит сам retrieve)."""
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            return queryset.filter(**{
+                self.lookup_field: self.kwargs[lookup_url_kwarg],
+            })
+        except (TypeError, ValueError, ValidationError):
+            return None
+
+    def get_object_values(self, queryset, *fields) -> tuple | None:
+        """Значения fields объекта из URL без загрузки самого объекта."""
+        query = self.get_object_query(queryset)
+        if query is None:
+            return None
+        return query.values_list(*fields).first()
+
+    def get_conditional_response(self, request, get_validators, get_response):
+        if request.method not in ('GET', 'HEAD'):
+            return get_response()
+
+        etag, last_modified = get_validators(request)
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            response = get_response()
+        set_validators(response, etag, last_modified)
+        return response
+
+
+def not_modified(request, etag: str | None,
+                 last_modified: datetime | None):
+    """Ответ 304 (или 412), если валидаторы совпали с заголовками запроса,
+    иначе None."""
+    if last_modified is not None:
+        last_modified = int(last_modified.timestamp())
+    return get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+
+
+def set_validators(response, etag: str | None,
+                   last_modified: datetime | None):
+    if not 200 <= response.status_code < 300:
+        return
+    if etag is not None:
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+
+
+def latest(*values: datetime | None) -> datetime | None:
+    values = [x for x in values if x is not None]
+    return max(values) if values else None
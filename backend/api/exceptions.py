@@ -41,3 +41,13 @@ class NotInShoppingCart(APIException):
     status_code = 400
     default_detail = 'You haven\'t added this recipe to your cart.'
     default_code = 'not_in_cart'
+
+
+class SyncTokenExpired(APIException):
+    status_code = 410
+    default_detail = ('Sync token is older than the retained change log, '
+                      'resync fully and continue from the returned token.')
+    default_code = 'sync_token_expired'
+
+    def __init__(self, token):
+        super().__init__({'detail': self.default_detail, 'token': token})
@@ -0,0 +1,176 @@
+"""Каталог ингредиентов в памяти процесса для поиска по началу названия.
+
+Таблица ингредиентов маленькая и почти не меняется, поэтому она целиком
+загружается в отсортированный список, а поиск идёт бинарным поиском без
+обращения к БД. Названия сравниваются без учёта регистра и с ё, равной е
+(normalize): ?name=Мол находит «молоко». Актуальность проверяется по
+версии в общем кэше, которую сбрасывают сигналы при изменении ингредиентов
+(см. api.signals).
+
+Полный список без фильтра один раз рендерится в JSON и сжимается, после чего
+отдаётся готовыми байтами до следующего изменения ингредиентов.
+"""
+from asgiref.sync import sync_to_async
+from bisect import bisect_left
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.renderers import JSONRenderer
+from threading import Lock
+import gzip
+import hashlib
+import uuid
+
+from foodgram.models import Ingredient
+
+from .serializers import IngredientSerializer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+VERSION_CACHE_KEY = 'ingredients:version'
+
+
+def normalize(name: str) -> str:
+    return name.casefold().replace('ё', 'е')
+
+
+def bump_version():
+    cache.set(VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+
+
+def get_version() -> str:
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        # add, а не set: другой процесс мог успеть записать свою версию
+        if not cache.add(VERSION_CACHE_KEY, version, None):
+            version = cache.get(VERSION_CACHE_KEY, version)
+    return version
+
+
+class RenderedCatalog:
+    """Полный список ингредиентов в виде JSON в нескольких кодировках."""
+
+    # Content-Encoding -> тело ответа; '' - без сжатия
+    bodies: dict[str, bytes]
+    etag: str
+
+    def __init__(self, body: bytes):
+        self.bodies = {'': body, 'gzip': gzip.compress(body, mtime=0)}
+        if brotli is not None:
+            self.bodies['br'] = brotli.compress(body)
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+
+    def negotiate(self, accept_encoding: str) -> str:
+        """Выбирает кодировку по заголовку Accept-Encoding."""
+        accepted = set()
+        for item in accept_encoding.split(','):
+            coding, _, params = item.strip().partition(';')
+            params = params.replace(' ', '')
+            if params.startswith('q=') and float(params[2:] or 0) == 0:
+                continue
+            accepted.add(coding.strip().lower())
+
+        for coding in ('br', 'gzip'):
+            if coding in self.bodies and (coding in accepted
+                                          or '*' in accepted):
+                return coding
+        return ''
+
+    def get_etag(self, coding: str) -> str:
+        # Сильный ETag должен различаться для разных представлений
+        return f'"{self.etag}-{coding}"' if coding else f'"{self.etag}"'
+
+
+class IngredientCatalog:
+    version: str | None
+    # Нормализованные названия и ингредиенты в одном порядке. Подменяются
+    # одним присваиванием, чтобы поиск не увидел половину новой версии
+    index: tuple[list[str], list[Ingredient]]
+
+    def __init__(self):
+        self.lock = Lock()
+        self.version = None
+        self.index = ([], [])
+        self.rendered_catalog = None  # type: RenderedCatalog | None
+
+    def load(self, version: str):
+        # Из основной БД: версию сбрасывает запись в неё, и отставшая
+        # реплика закэшировала бы старый список под новой версией
+        ingredients = sorted(
+            Ingredient.objects.using(DEFAULT_DB_ALIAS).only(
+                'id', 'name', 'measurement_unit'),
+            key=lambda x: (normalize(x.name), x.name, x.pk),
+        )
+        self.index = ([normalize(x.name) for x in ingredients], ingredients)
+        self.rendered_catalog = None
+        self.version = version
+
+    def refresh(self):
+        version = get_version()
+        if version == self.version:
+            return
+        with self.lock:
+            if version != self.version:
+                self.load(version)
+
+    async def arefresh(self):
+        """refresh для асинхронного кода: каталог загружается в потоке."""
+        version = await cache.aget(VERSION_CACHE_KEY)
+        if version is None or version != self.version:
+            await sync_to_async(self.refresh)()
+
+    def all(self) -> list[Ingredient]:
+        self.refresh()
+        return self.index[1]
+
+    def rendered(self) -> RenderedCatalog:
+        self.refresh()
+        return self.get_rendered()
+
+    async def arendered(self) -> RenderedCatalog:
+        await self.arefresh()
+        return self.get_rendered()
+
+    def get_rendered(self) -> RenderedCatalog:
+        rendered = self.rendered_catalog
+        if rendered is None:
+            with self.lock:
+                rendered = self.rendered_catalog
+                if rendered is None:
+                    rendered = self.render(self.index[1])
+                    self.rendered_catalog = rendered
+        return rendered
+
+    def render(self, ingredients: list[Ingredient]) -> RenderedCatalog:
+        # Порядок как у Ingredient.Meta.ordering и выдачи из БД, а не как в
+        # индексе поиска
+        ingredients = sorted(ingredients, key=lambda x: (x.name, x.pk))
+        data = IngredientSerializer(ingredients, many=True).data
+        return RenderedCatalog(JSONRenderer().render(data))
+
+    def search(self, prefix: str) -> list[Ingredient]:
+        self.refresh()
+        return self.find(prefix)
+
+    async def asearch(self, prefix: str) -> list[Ingredient]:
+        await self.arefresh()
+        return self.find(prefix)
+
+    def find(self, prefix: str) -> list[Ingredient]:
+        """Поиск по уже загруженному каталогу, без проверки версии."""
+        keys, ingredients = self.index
+
+        key = normalize(prefix)
+        result = []
+        for i in range(bisect_left(keys, key), len(keys)):
+            if not keys[i].startswith(key):
+                break
+            result.append(ingredients[i])
+        return result
+
+
+catalog = IngredientCatalog()
@@ -0,0 +1,211 @@
+"""Замеры производительности запросов (PERF_INSTRUMENTATION).
+
+Для доли запросов PERF_SAMPLE_RATE считаются число и время SQL-запросов,
+повторяющиеся запросы (одинаковый SQL с точностью до параметров - типичный
+признак N+1) и время сериализации. Результат уходит в заголовок
+Server-Timing и, если превышен один из порогов PERF_SLOW_*, в лог
+api.performance одной JSON-строкой. Время ответа проверяется на порог у
+всех запросов. Те же замеры попадают в метрики /metrics (api.metrics).
+
+SQL перехватывается через execute_wrappers каждого соединения, а замеры
+текущего запроса лежат в ContextVar, поэтому они видны и из потоков
+sync_to_async под ASGI. Запросы вне замеряемого HTTP-запроса (фоновые
+потоки, команды) только проходят через обёртку.
+"""
+from asgiref.sync import iscoroutinefunction
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework.serializers import BaseSerializer
+from time import perf_counter
+import json
+import logging
+import random
+import re
+
+from . import metrics as prometheus
+
+
+logger = logging.getLogger('api.performance')
+
+_current = ContextVar('request_metrics', default=None)
+
+# Списки параметров разной длины: IN (%s, %s) и IN (%s) - один запрос
+_PLACEHOLDER_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+
+
+def fingerprint(sql: str) -> str:
+    return _PLACEHOLDER_LIST.sub('(...)', sql)
+
+
+@dataclass
+class RequestMetrics:
+    started_at: float = field(default_factory=perf_counter)
+    queries: int = 0
+    sql_time: float = 0
+    fingerprints: Counter = field(default_factory=Counter)
+    serializer_time: float = 0
+    serializer_depth: int = 0
+
+    @property
+    def duplicates(self) -> int:
+        return self.queries - len(self.fingerprints)
+
+    def top_duplicates(self, limit: int = 3) -> list[dict]:
+        return [
+            {'count': count, 'sql': sql[:300]}
+            for sql, count in self.fingerprints.most_common(limit)
+            if count > 1
+        ]
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started_at = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.sql_time += perf_counter() - started_at
+        metrics.queries += 1
+        metrics.fingerprints[fingerprint(sql)] += 1
+
+
+def install_query_hook(sender, connection, **kwargs):
+    # Соединение открывается заново после закрытия, а обёртки у объекта
+    # соединения остаются
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+_serializer_data = BaseSerializer.data
+
+
+def timed_serializer_data(self):
+    metrics = _current.get()
+    if metrics is None:
+        return _serializer_data.fget(self)
+    # Вложенные вызовы .data считаются в составе внешнего
+    metrics.serializer_depth += 1
+    started_at = perf_counter()
+    try:
+        return _serializer_data.fget(self)
+    finally:
+        metrics.serializer_depth -= 1
+        if not metrics.serializer_depth:
+            metrics.serializer_time += perf_counter() - started_at
+
+
+def install():
+    connection_created.connect(
+        install_query_hook, dispatch_uid='api.instrumentation')
+    # Соединения, открытые до загрузки middleware (проверки при запуске)
+    for connection in connections.all(initialized_only=True):
+        install_query_hook(None, connection)
+    BaseSerializer.data = property(timed_serializer_data)
+
+
+def get_view_name(request) -> str | None:
+    """RecipeViewSet.list, ShortLinkRedirect.get и т.п."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    view = match.func
+    cls = getattr(view, 'cls', None)
+    if cls is None:
+        return match.view_name or view.__name__
+    method = request.method.lower()
+    actions = getattr(view, 'actions', None)
+    if actions is not None:
+        method = actions.get(method, method)
+    return f'{cls.__name__}.{method}'
+
+
+def start():
+    if random.random() >= settings.PERF_SAMPLE_RATE:
+        return None, None
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def finish(request, response, started_at: float, metrics):
+    elapsed = perf_counter() - started_at
+    if settings.METRICS:
+        prometheus.observe_request(
+            get_view_name(request), request.method, response.status_code,
+            elapsed, None if metrics is None else metrics.queries)
+
+    if metrics is not None and settings.PERF_SERVER_TIMING:
+        response['Server-Timing'] = ', '.join([
+            f'total;dur={elapsed * 1000:.1f}',
+            f'db;dur={metrics.sql_time * 1000:.1f};'
+            f'desc="{metrics.queries} queries, '
+            f'{metrics.duplicates} duplicates"',
+            f'serializer;dur={metrics.serializer_time * 1000:.1f}',
+        ])
+
+    slow = elapsed * 1000 >= settings.PERF_SLOW_REQUEST_MS
+    if metrics is not None:
+        slow = (
+            slow
+            or metrics.queries >= settings.PERF_SLOW_QUERY_COUNT
+            or max(metrics.fingerprints.values(), default=0)
+            >= settings.PERF_SLOW_DUPLICATE_QUERIES
+        )
+    if not slow:
+        return
+
+    record = {
+        'method': request.method,
+        'path': request.path,
+        'view': get_view_name(request),
+        'status': response.status_code,
+        'duration_ms': round(elapsed * 1000, 1),
+    }
+    if metrics is not None:
+        record.update({
+            'queries': metrics.queries,
+            'sql_ms': round(metrics.sql_time * 1000, 1),
+            'duplicate_queries': metrics.duplicates,
+            'top_duplicates': metrics.top_duplicates(),
+            'serializer_ms': round(metrics.serializer_time * 1000, 1),
+        })
+    logger.warning(
+        json.dumps(record, ensure_ascii=False), extra={'performance': record})
+
+
+@sync_and_async_middleware
+def performance_middleware(get_response):
+    if not settings.PERF_INSTRUMENTATION:
+        raise MiddlewareNotUsed
+    install()
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            started_at = perf_counter()
+            metrics, token = start()
+            try:
+                response = await get_response(request)
+            finally:
+                if token is not None:
+                    _current.reset(token)
+            finish(request, response, started_at, metrics)
+            return response
+    else:
+        def middleware(request):
+            started_at = perf_counter()
+            metrics, token = start()
+            try:
+                response = get_response(request)
+            finally:
+                if token is not None:
+                    _current.reset(token)
+            finish(request, response, started_at, metrics)
+            return response
+    return middleware
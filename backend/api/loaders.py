@@ -0,0 +1,54 @@
+from typing import Iterable
+
+from foodgram.models import Subscription, User
+
+
+class SubscriptionLoader:
+    """Кэширует в рамках одного запроса, на кого подписан текущий
+    пользователь.
+
+    Идентификаторы пользователей сначала накапливаются через ``prime``, а
+    затем разрешаются одним запросом при первом обращении к
+    ``is_subscribed``.
+    """
+
+    def __init__(self, user: User | None):
+        self.user = user
+        self.resolved = {}  # type: dict[int, bool]
+        self.pending = set()  # type: set[int]
+
+    @classmethod
+    def for_request(cls, request) -> 'SubscriptionLoader':
+        loader = getattr(request, '_subscription_loader', None)
+        if loader is None:
+            user = getattr(request, 'user', None)
+            loader = cls(user if isinstance(user, User) else None)
+            request._subscription_loader = loader
+        return loader
+
+    def prime(self, user_ids: Iterable[int]):
+        if self.user is None:
+            return
+        self.pending.update(
+            x for x in user_ids
+            if x not in self.resolved and x != self.user.pk
+        )
+
+    def is_subscribed(self, user_id: int) -> bool:
+        # На себя подписаться нельзя, в БД за этим ходить незачем
+        if self.user is None or user_id == self.user.pk:
+            return False
+        if user_id not in self.resolved:
+            self.pending.add(user_id)
+            self.load()
+        return self.resolved[user_id]
+
+    def load(self):
+        subscribed = set(
+            Subscription.objects
+            .filter(user=self.user, subscribed_to__in=self.pending)
+            .values_list('subscribed_to', flat=True)
+        )
+        for user_id in self.pending:
+            self.resolved[user_id] = user_id in subscribed
+        self.pending.clear()
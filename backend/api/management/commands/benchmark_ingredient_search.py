@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework.request import Request
+from timeit import timeit
+
+from api.ingredient_catalog import catalog
+from api.views import IngredientViewSet, NameSearchFilter
+from foodgram.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare ingredient prefix search through the in-memory catalog '
+        'with the SQL search used by NameSearchFilter.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('prefixes', nargs='*', default=[
+            'а', 'б', 'ма', 'сол', 'сыр', 'кури', 'x',
+        ])
+        parser.add_argument('-n', '--number', type=int, default=200)
+
+    def sql_search(self, prefix):
+        request = Request(RequestFactory().get(
+            '/', {NameSearchFilter.search_param: prefix}))
+        return list(NameSearchFilter().filter_queryset(
+            request, Ingredient.objects.all(), IngredientViewSet()))
+
+    def handle(self, *args, prefixes, number, **options):
+        catalog.refresh()
+        self.stdout.write(
+            f'{Ingredient.objects.count()} ingredients, '
+            f'{number} lookups per prefix\n'
+        )
+        self.stdout.write(
+            f'{"prefix":<10}{"results":>8}{"sql, ms":>12}'
+            f'{"catalog, ms":>14}{"speedup":>10}'
+        )
+        for prefix in prefixes:
+            results = len(catalog.search(prefix))
+            sql = timeit(lambda: self.sql_search(prefix), number=number)
+            memory = timeit(lambda: catalog.search(prefix), number=number)
+            self.stdout.write(
+                f'{prefix:<10}{results:>8}'
+                f'{sql / number * 1000:>12.3f}'
+                f'{memory / number * 1000:>14.3f}'
+                f'{sql / memory:>9.1f}x'
+            )
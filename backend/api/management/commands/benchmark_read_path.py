@@ -0,0 +1,93 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from http.client import HTTPConnection, HTTPException
+from time import perf_counter
+from urllib.parse import quote, urlsplit
+import itertools
+import statistics
+import threading
+
+
+class Command(BaseCommand):
+    help = (
+        'Load a running server with concurrent GET requests to the read '
+        'endpoints and report throughput and latency percentiles. Used to '
+        'compare the wsgi and asgi profiles of gunicorn.conf.py.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'url', help='Server root, e.g. http://localhost:8000')
+        parser.add_argument(
+            '--path',
+            action='append',
+            dest='paths',
+            help='Request path; may be repeated. Paths are requested in turn.',
+        )
+        parser.add_argument('-c', '--concurrency', type=int, default=32)
+        parser.add_argument('-n', '--requests', type=int, default=2000)
+        parser.add_argument('--token', help='Authorization token.')
+
+    def handle(self, *args, url, paths, concurrency, requests, token,
+               **options):
+        parts = urlsplit(url)
+        if parts.scheme != 'http' or not parts.hostname:
+            raise CommandError('Only http://host[:port] URLs are supported.')
+        paths = paths or [
+            '/api/recipes/',
+            '/api/recipes/?limit=12',
+            '/api/ingredients/?name=сы',
+        ]
+        paths = [quote(x, safe='/?=&%') for x in paths]
+        headers = {'Accept': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Token {token}'
+
+        # Общий счётчик запросов, каждый поток держит своё keep-alive
+        # соединение
+        counter = itertools.count()
+        lock = threading.Lock()
+        local = threading.local()
+
+        def worker():
+            latencies, errors = [], 0
+            while True:
+                with lock:
+                    i = next(counter)
+                if i >= requests:
+                    return latencies, errors
+                if not hasattr(local, 'connection'):
+                    local.connection = HTTPConnection(
+                        parts.hostname, parts.port or 80, timeout=30)
+                started = perf_counter()
+                try:
+                    local.connection.request(
+                        'GET', paths[i % len(paths)], headers=headers)
+                    response = local.connection.getresponse()
+                    response.read()
+                    if response.status != 200:
+                        errors += 1
+                except (OSError, HTTPException):
+                    errors += 1
+                    del local.connection
+                latencies.append(perf_counter() - started)
+
+        started = perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = [executor.submit(worker) for _ in range(concurrency)]
+            results = [x.result() for x in results]
+        elapsed = perf_counter() - started
+
+        latencies = sorted(x for r, _ in results for x in r)
+        errors = sum(e for _, e in results)
+        quantiles = statistics.quantiles(
+            latencies, n=100, method='inclusive')
+        self.stdout.write(
+            f'{len(latencies)} requests, concurrency {concurrency}, '
+            f'{errors} errors\n'
+            f'throughput: {len(latencies) / elapsed:.1f} req/s\n'
+            f'latency, ms: p50 {quantiles[49] * 1000:.1f}, '
+            f'p90 {quantiles[89] * 1000:.1f}, '
+            f'p99 {quantiles[98] * 1000:.1f}, '
+            f'max {latencies[-1] * 1000:.1f}'
+        )
@@ -0,0 +1,116 @@
+"""Метрики в формате Prometheus по адресу /metrics.
+
+Время ответа и число SQL-запросов по действиям DRF записывает
+api.instrumentation.performance_middleware (число запросов - у доли
+PERF_SAMPLE_RATE), попадания в кэши - места, где эти кэши читаются.
+
+Под gunicorn каждый воркер пишет значения в файлы в общей папке
+PROMETHEUS_MULTIPROC_DIR (multiprocess-режим prometheus_client), а /metrics
+в любом воркере собирает их со всех воркеров. Папку задаёт и очищает при
+старте gunicorn.conf.py. Без неё, например под runserver, метрики хранятся
+в памяти процесса.
+"""
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from time import monotonic
+import os
+import socket
+
+
+# Как часто воркер обновляет свои показатели процесса
+PROCESS_UPDATE_INTERVAL = 5
+
+REQUEST_LATENCY = Histogram(
+    'foodgram_http_request_duration_seconds',
+    'Request latency by view action and response status.',
+    ['view', 'method', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+DB_QUERIES = Histogram(
+    'foodgram_db_queries_per_request',
+    'SQL queries per sampled request by view action.',
+    ['view'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+CACHE_REQUESTS = Counter(
+    'foodgram_cache_requests',
+    'Cache lookups by cache and result (hit or miss).',
+    ['cache', 'result'],
+)
+# Свой pid у каждого воркера в метке worker; live - только живые воркеры
+WORKER_INFO = Gauge(
+    'foodgram_worker_info',
+    'Running worker process, always 1.',
+    ['host', 'worker'],
+    multiprocess_mode='livemax',
+)
+WORKER_RSS = Gauge(
+    'foodgram_worker_resident_memory_bytes',
+    'Resident memory size of the worker process.',
+    ['host', 'worker'],
+    multiprocess_mode='livemax',
+)
+
+_process_updated_at = None
+
+
+def is_multiprocess() -> bool:
+    return 'PROMETHEUS_MULTIPROC_DIR' in os.environ
+
+
+def get_rss() -> int | None:
+    try:
+        with open('/proc/self/statm') as file:
+            pages = int(file.read().split()[1])
+    except OSError:
+        # Не Linux
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE')
+
+
+def update_process_metrics(force: bool = False):
+    global _process_updated_at
+    now = monotonic()
+    if (not force and _process_updated_at is not None
+            and now - _process_updated_at < PROCESS_UPDATE_INTERVAL):
+        return
+    _process_updated_at = now
+    # pid читается каждый раз: модуль мог быть загружен до fork
+    identity = (socket.gethostname(), str(os.getpid()))
+    WORKER_INFO.labels(*identity).set(1)
+    rss = get_rss()
+    if rss is not None:
+        WORKER_RSS.labels(*identity).set(rss)
+
+
+def observe_request(view: str | None, method: str, status: int,
+                    duration: float, queries: int | None):
+    view = view or 'unmatched'
+    REQUEST_LATENCY.labels(view, method, status).observe(duration)
+    if queries is not None:
+        DB_QUERIES.labels(view).observe(queries)
+    update_process_metrics()
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def metrics_view(request):
+    update_process_metrics(force=True)
+    if is_multiprocess():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(
+        generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -1,6 +1,321 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Model, Q, QuerySet
+from django.db.models.constants import LOOKUP_SEP
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+import binascii
+import hashlib
+import json
+import uuid
+
+from foodgram.models import Favorite, Recipe, ShoppingCart, Subscription, User
+
+from . import metrics
+
+
+# Изменения этих моделей сбрасывают закэшированные количества (api.signals)
+COUNTED_MODELS = (Favorite, Recipe, ShoppingCart, Subscription, User)
+
+
+def count_version_key(table: str) -> str:
+    return f'pagination:count-version:{table}'
+
+
+def bump_count_version(model: type[Model]):
+    """Сбрасывает закэшированные количества для запросов с таблицей model."""
+    cache.set(count_version_key(model._meta.db_table), uuid.uuid4().hex, None)
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который не считает COUNT(*) на каждый запрос.
+
+    Количество кэшируется на PAGINATION_COUNT_CACHE_TIMEOUT секунд по тексту
+    SQL-запроса и версиям таблиц COUNTED_MODELS, которые встречаются в этом
+    запросе. На PostgreSQL для больших выборок вместо точного количества
+    берётся оценка планировщика, если она не меньше
+    PAGINATION_COUNT_ESTIMATE_THRESHOLD (0 отключает оценку).
+
+    Оценка идёт только в count ответа: строк может быть больше (например,
+    до ANALYZE после массовой вставки), поэтому номер страницы при ней
+    сверху не ограничивается, а 404 отдаётся только для пустой страницы.
+    """
+
+    count_is_estimate = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super().count
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+
+        key = self.get_cache_key(sql, params)
+        value = cache.get(key)
+        metrics.record_cache('pagination_count', hit=value is not None)
+        if value is None:
+            count = self.get_estimate(queryset, sql, params)
+            value = (queryset.count(), False) if count is None else (
+                count, True)
+            cache.set(key, value, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        count, self.count_is_estimate = value
+        return count
+
+    def validate_number(self, number):
+        self.count  # выставляет count_is_estimate
+        if not self.count_is_estimate:
+            return super().validate_number(number)
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.count_is_estimate:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        objects = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not objects and number > 1:
+            raise EmptyPage(self.error_messages['no_results'])
+        page = EstimatedPage(objects[:self.per_page], number, self)
+        page.has_more = len(objects) > self.per_page
+        return page
+
+    def get_cache_key(self, sql, params):
+        tables = [x._meta.db_table for x in COUNTED_MODELS]
+        versions = cache.get_many(
+            [count_version_key(x) for x in tables if f'"{x}"' in sql])
+        digest = hashlib.sha256(
+            repr((sql, params, sorted(versions.items()))).encode()
+        ).hexdigest()
+        return f'pagination:counts:{digest}'
+
+    def get_estimate(self, queryset, sql, params) -> int | None:
+        threshold = settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD
+        connection = connections[queryset.db]
+        if not threshold or connection.vendor != 'postgresql':
+            return None
+
+        with connection.cursor() as cursor:
+            if not queryset.query.where:
+                # Без фильтров достаточно статистики таблицы
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class'
+                    ' WHERE oid = %s::regclass',
+                    [queryset.model._meta.db_table],
+                )
+                estimate = cursor.fetchone()[0]
+            else:
+                cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                estimate = int(plan[0]['Plan']['Plan Rows'])
+
+        # Для небольших выборок и таблиц без статистики (reltuples = -1)
+        # считаем точно
+        if estimate < threshold:
+            return None
+        return estimate
+
+
+class EstimatedPage(Page):
+    """Страница при оценочном количестве: есть ли следующая, известно по
+    лишней выбранной строке, а не по num_pages."""
+
+    has_more = False
+
+    def has_next(self):
+        return self.has_more
+
+
+class KeysetPagination(BasePagination):
+    """Пагинация по курсору (keyset) без OFFSET и COUNT(*).
+
+    Курсор хранит значения полей сортировки последнего или первого объекта
+    страницы, поэтому любая страница стоит столько же, сколько первая.
+    Последнее поле сортировки должно быть уникальным.
+    """
+
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering: tuple[str, ...], page_size: int):
+        self.ordering = ordering
+        self.page_size = page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+
+        position, reverse = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param, ''))
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(self.invert(x) for x in ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                values = self.parse_position(queryset, position)
+                queryset = queryset.filter(self.after(ordering, values))
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.next_position = self.previous_position = None
+        if results:
+            first = self.get_position(results[0])
+            last = self.get_position(results[-1])
+            if reverse:
+                self.next_position = last
+                self.previous_position = first if has_more else None
+            else:
+                self.next_position = last if has_more else None
+                self.previous_position = (
+                    first if position is not None else None)
+        elif position is not None:
+            # Пустая страница после курсора: можно вернуться назад
+            if reverse:
+                self.next_position = position
+            else:
+                self.previous_position = position
+
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_link(self.next_position, reverse=False),
+            'previous': self.get_link(self.previous_position, reverse=True),
+            'results': data,
+        })
+
+    def get_link(self, position, reverse):
+        if position is None:
+            return None
+        return replace_query_param(
+            self.base_url,
+            self.cursor_query_param,
+            self.encode_cursor(position, reverse),
+        )
+
+    def get_position(self, obj):
+        return [self.to_json(getattr(obj, x.lstrip('-'))) for x in
+                self.ordering]
+
+    @staticmethod
+    def to_json(value):
+        if isinstance(value, (int, str)) or value is None:
+            return value
+        # datetime и прочее: фильтры Django сами разберут строку
+        return value.isoformat()
+
+    def parse_position(self, queryset, position) -> list:
+        """Значения курсора, приведённые к типам полей сортировки.
+        Исключения те же, что у to_python полей."""
+        result = []
+        for field, value in zip(self.ordering, position):
+            if value is None:
+                raise ValidationError('Cursor value must not be null')
+            result.append(
+                self.get_field(queryset, field).to_python(value))
+        return result
+
+    @staticmethod
+    def get_field(queryset, name):
+        """Поле модели или выходное поле аннотации queryset."""
+        name = name.lstrip('-')
+        annotation = queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        model = queryset.model
+        *path, name = name.split(LOOKUP_SEP)
+        for part in path:
+            model = model._meta.get_field(part).related_model
+        return model._meta.get_field(name)
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    @staticmethod
+    def after(ordering, position):
+        """Условие «строго после position» для сортировки ordering:
+        (a > x) OR (a = x AND b > y) OR ..."""
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def encode_cursor(self, position, reverse):
+        data = json.dumps({'p': position, 'r': reverse}).encode()
+        return urlsafe_b64encode(data).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        # Пустой курсор - первая страница
+        if not cursor:
+            return None, False
+        try:
+            padding = '=' * (-len(cursor) % 4)
+            data = json.loads(urlsafe_b64decode(cursor + padding))
+            position, reverse = data['p'], bool(data['r'])
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or (
+                len(position) != len(self.ordering)):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
 
 
 class PageLimitPagination(PageNumberPagination):
+    """Постраничная пагинация с параметром limit.
+
+    Если у представления задан cursor_ordering, то при наличии параметра
+    cursor в запросе (пустое значение - первая страница) включается
+    KeysetPagination с тем же limit.
+    """
+
+    django_paginator_class = CachedCountPaginator
     page_size = 6
     page_size_query_param = 'limit'
+    cursor_query_param = KeysetPagination.cursor_query_param
+
+    keyset = None  # type: KeysetPagination | None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = getattr(view, 'cursor_ordering', None)
+        if ordering and self.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination(
+                ordering, self.get_page_size(request))
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,22 @@
+from rest_framework.permissions import SAFE_METHODS
+
+from foodgram import db_routing
+
+
+class ReplicaReadMixin:
+    """Читает с реплики БД в безопасных запросах к действиям replica_actions
+    (см. foodgram.db_routing). Остальные действия, например
+    download_shopping_cart, и любые изменения идут в основную БД."""
+
+    replica_actions = ('list', 'retrieve')
+
+    def dispatch(self, request, *args, **kwargs):
+        with db_routing.read_scope():
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Пользователь уже известен: аутентификация шла по основной БД
+        if (request.method in SAFE_METHODS
+                and self.action in self.replica_actions):
+            db_routing.allow_replica_reads(request.user)
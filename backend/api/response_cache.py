@@ -0,0 +1,184 @@
+"""Кэш ответов для анонимных пользователей.
+
+Для анонимов is_favorited и is_in_shopping_cart всегда false, поэтому ответы
+списка и детальной страницы рецептов у всех одинаковые. Ключи содержат
+версию, которую сбрасывают сигналы при изменении рецептов, их ингредиентов
+и авторов (см. api.signals), так что старые записи просто перестают
+читаться и истекают сами.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+from threading import Lock
+from time import monotonic, sleep
+from typing import Awaitable, Callable
+from weakref import WeakValueDictionary
+import asyncio
+import hashlib
+import uuid
+
+from . import metrics
+
+
+VERSION_CACHE_KEY = 'anonymous-cache:version'
+
+# Сколько секунд ждать, пока другой процесс заполнит кэш, прежде чем
+# посчитать ответ самостоятельно
+LOCK_TIMEOUT = 5
+POLL_INTERVAL = 0.05
+
+# Блокировки внутри процесса, по одной на группу ключей
+local_locks = [Lock() for _ in range(64)]
+# То же для асинхронных представлений: asyncio.Lock на ключ, пока его
+# кто-то держит или ждёт
+async_locks = WeakValueDictionary()
+
+
+def bump_version():
+    cache.set(VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+
+
+def get_version() -> str:
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(VERSION_CACHE_KEY, version, None):
+            version = cache.get(VERSION_CACHE_KEY, version)
+    return version
+
+
+def get_or_compute(key: str, compute: Callable, timeout: int):
+    """Возвращает значение из кэша или считает его, причём одновременные
+    промахи по одному ключу считают значение только один раз: внутри
+    процесса - через блокировку, между процессами - через cache.add."""
+    value = cache.get(key)
+    if value is not None:
+        metrics.record_cache('anonymous_response', hit=True)
+        return value
+
+    with local_locks[hash(key) % len(local_locks)]:
+        value = cache.get(key)
+        if value is not None:
+            return value
+
+        lock_key = f'{key}:lock'
+        if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+            deadline = monotonic() + LOCK_TIMEOUT
+            while monotonic() < deadline:
+                sleep(POLL_INTERVAL)
+                value = cache.get(key)
+                if value is not None:
+                    return value
+
+        metrics.record_cache('anonymous_response', hit=False)
+        try:
+            value = compute()
+            cache.set(key, value, timeout)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+
+async def aget_or_compute(key: str, compute: Callable[[], Awaitable],
+                          timeout: int):
+    """get_or_compute для асинхронных представлений; compute - корутина."""
+    value = await cache.aget(key)
+    if value is not None:
+        metrics.record_cache('anonymous_response', hit=True)
+        return value
+
+    async with async_locks.setdefault(key, asyncio.Lock()):
+        value = await cache.aget(key)
+        if value is not None:
+            return value
+
+        lock_key = f'{key}:lock'
+        if not await cache.aadd(lock_key, 1, LOCK_TIMEOUT):
+            deadline = monotonic() + LOCK_TIMEOUT
+            while monotonic() < deadline:
+                await asyncio.sleep(POLL_INTERVAL)
+                value = await cache.aget(key)
+                if value is not None:
+                    return value
+
+        metrics.record_cache('anonymous_response', hit=False)
+        try:
+            value = await compute()
+            await cache.aset(key, value, timeout)
+        finally:
+            await cache.adelete(lock_key)
+        return value
+
+
+class AnonymousCacheMixin:
+    """Кэширует ответы list и retrieve для неавторизованных GET-запросов."""
+
+    def list(self, request, *args, **kwargs):
+        return self.get_anonymous_response(
+            request, lambda: super(AnonymousCacheMixin, self).list(
+                request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_anonymous_response(
+            request, lambda: super(AnonymousCacheMixin, self).retrieve(
+                request, *args, **kwargs))
+
+    def get_anonymous_cache_key(self, request) -> str:
+        params = sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()
+        )
+        # Хост и схема попадают в абсолютные ссылки next/previous и картинок
+        digest = hashlib.sha256(repr((
+            request.scheme,
+            request.get_host(),
+            self.basename,
+            self.action,
+            sorted(self.kwargs.items()),
+            params,
+            get_version(),
+        )).encode()).hexdigest()
+        return f'anonymous-cache:{digest}'
+
+    def get_anonymous_validators(self, request, compute: Callable):
+        """Валидаторы (etag, last_modified) ответа; для анонимов - из кэша
+        рядом с самим ответом. Ключ включает версию, поэтому валидаторы
+        верны, пока верен закэшированный ответ, а попадание в кэш не стоит
+        запросов к БД."""
+        if request.user.is_authenticated:
+            return compute()
+        return get_or_compute(
+            self.get_anonymous_validators_key(request),
+            compute,
+            settings.ANONYMOUS_CACHE_TIMEOUT,
+        )
+
+    def get_anonymous_validators_key(self, request) -> str:
+        return f'{self.get_anonymous_cache_key(request)}:validators'
+
+    def get_anonymous_response(self, request, get_response):
+        if request.user.is_authenticated or request.method != 'GET':
+            return get_response()
+
+        def compute():
+            response = get_response()
+            # Кэшируются только успешные ответы, ошибки поднимаются как есть
+            if response.status_code != status.HTTP_200_OK:
+                raise UncacheableResponse(response)
+            return response.data
+
+        try:
+            data = get_or_compute(
+                self.get_anonymous_cache_key(request),
+                compute,
+                settings.ANONYMOUS_CACHE_TIMEOUT,
+            )
+        except UncacheableResponse as e:
+            return e.response
+        return Response(data)
+
+
+class UncacheableResponse(Exception):
+    def __init__(self, response):
+        self.response = response
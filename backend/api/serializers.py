@@ -1,4 +1,8 @@
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db.models.fields.files import FieldFile
+from django.http import QueryDict
+from django.db import models, transaction
 from django.urls import reverse
 from djoser.serializers import (
     UserCreateSerializer as BaseUserCreateSerializer,
@@ -6,17 +10,23 @@ from djoser.serializers import (
 )
 from rest_framework import serializers
 from urllib.parse import urljoin
-import base64
+import binascii
+import json
+import os
 import uuid
 
+from foodgram import changelog, constants, images, shopping_lists
 from foodgram.models import (
     Ingredient,
     Recipe,
     RecipeIngredient,
-    ShortLink,
+    ShoppingListItem,
     User,
 )
 
+from . import uploads
+from .loaders import SubscriptionLoader
+
 
 class UserCreateSerializer(BaseUserCreateSerializer):
     class Meta(BaseUserCreateSerializer.Meta):
@@ -26,31 +36,103 @@ class UserCreateSerializer(BaseUserCreateSerializer):
         }
 
 
+class UserListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # Собираем id всех пользователей на странице, чтобы SubscriptionLoader
+        # проверил подписки на них одним запросом
+        if isinstance(data, models.manager.BaseManager):
+            data = data.all()
+        data = list(data)
+
+        request = self.context.get('request')
+        if request is not None:
+            SubscriptionLoader.for_request(request).prime(
+                x.pk for x in data if not hasattr(x, 'is_subscribed'))
+
+        return super().to_representation(data)
+
+
+class ImageRenditionsField(serializers.ImageField):
+    """Ссылки на уменьшенные копии картинки (foodgram.images):
+    ``{имя копии: URL}``. Пока копия не построена, вместо неё ссылка на
+    оригинал. Поле дополняет поле с оригиналом и задаётся с source на него.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        representation = {}
+        for rendition in images.RENDITIONS:
+            path = images.get_rendition(value, rendition)
+            file = value if path is None else FieldFile(
+                value.instance, value.field, path)
+            representation[rendition] = super().to_representation(file)
+        return representation
+
+
 class UserSerializer(BaseUserSerializer):
+    avatar_renditions = ImageRenditionsField(source='avatar')
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta(BaseUserSerializer.Meta):
-        fields = BaseUserSerializer.Meta.fields + ('avatar', 'is_subscribed')
+        fields = BaseUserSerializer.Meta.fields + (
+            'avatar', 'avatar_renditions', 'is_subscribed')
+        list_serializer_class = UserListSerializer
 
     def get_is_subscribed(self, obj: User):
-        user = None
+        # Аннотация из RecipeViewSet.annotate_queryset
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+
         request = self.context.get('request')
-        if request and hasattr(request, 'user'):
-            user = request.user
-        if isinstance(user, User):
-            return user.subscriptions.filter(subscribed_to=obj).exists()
-        return False
+        if request is None:
+            return False
+        return SubscriptionLoader.for_request(request).is_subscribed(obj.pk)
 
 
 class Base64ImageField(serializers.ImageField):
+    """Картинка файлом из multipart/form-data или строкой
+    data:image/<формат>;base64,... в JSON.
+
+    Размер проверяется до декодирования, base64 декодируется по частям
+    (api.uploads).
+    """
+
+    default_error_messages = {
+        'too_large': 'Image must not be larger than {max_size} bytes.',
+        'invalid_base64': 'Invalid base64 image data.',
+    }
+
     def to_internal_value(self, data):
+        max_size = settings.MAX_IMAGE_UPLOAD_SIZE
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(
-                base64.b64decode(imgstr),
-                name=str(uuid.uuid4()) + '.' + ext,
-            )
+            start = data.find(';base64,', 0, 256)
+            if start == -1:
+                self.fail('invalid_base64')
+            ext = data[len('data:image/'):start]
+            start += len(';base64,')
+
+            if uploads.decoded_size(data, start) > max_size:
+                self.fail('too_large', max_size=max_size)
+            try:
+                data = uploads.decode_base64_file(
+                    data,
+                    start,
+                    name=str(uuid.uuid4()) + '.' + ext,
+                    content_type='image/' + ext,
+                )
+            except (binascii.Error, ValueError):
+                self.fail('invalid_base64')
+        elif isinstance(data, UploadedFile):
+            if data.size > max_size:
+                self.fail('too_large', max_size=max_size)
+            # Имя файла от клиента не используем, как и для base64
+            ext = os.path.splitext(data.name)[1]
+            data.name = str(uuid.uuid4()) + ext
 
         return super().to_internal_value(data)
 
@@ -60,7 +142,9 @@ class AvatarSerializer(serializers.Serializer):
 
     def update(self, instance, validated_data):
         instance.avatar = validated_data.get('avatar', instance.avatar)
-        instance.save()
+        # instance - request.user, возможно копия из кэша аутентификации:
+        # полное сохранение вернуло бы назад остальные её поля
+        instance.save(update_fields=['avatar', 'updated_at'])
         return instance
 
 
@@ -70,8 +154,48 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
+class RecipeIngredientListSerializer(serializers.ListSerializer):
+    """Находит все ингредиенты списка одним запросом до проверки
+    элементов (см. IngredientPrimaryKeyField)."""
+
+    ingredients = None  # type: dict[int, Ingredient] | None
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            ids = set()
+            for item in data:
+                if not isinstance(item, dict):
+                    continue
+                try:
+                    ids.add(int(item.get('id')))
+                except (TypeError, ValueError):
+                    # Ошибку элемента сообщит IngredientPrimaryKeyField
+                    pass
+            self.ingredients = Ingredient.objects.in_bulk(ids)
+        return super().to_internal_value(data)
+
+
+class IngredientPrimaryKeyField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField, который берёт ингредиент из заранее
+    загруженных RecipeIngredientListSerializer, с теми же ошибками."""
+
+    def to_internal_value(self, data):
+        ingredients = getattr(self.parent.parent, 'ingredients', None)
+        if ingredients is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in ingredients:
+            self.fail('does_not_exist', pk_value=data)
+        return ingredients[pk]
+
+
 class RecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
+    id = IngredientPrimaryKeyField(
         queryset=Ingredient.objects.all(),
         source='ingredient',
     )
@@ -81,6 +205,7 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = RecipeIngredient
         fields = ('id', 'name', 'measurement_unit', 'amount')
+        list_serializer_class = RecipeIngredientListSerializer
 
     def get_name(self, obj):
         return obj.ingredient.name
@@ -95,15 +220,47 @@ class RecipeSerializer(serializers.ModelSerializer):
         default=serializers.CurrentUserDefault(),
     )
     image = Base64ImageField()
+    image_renditions = ImageRenditionsField(source='image')
     ingredients = RecipeIngredientSerializer(allow_empty=False, many=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        exclude = ('created_at',)
+        exclude = ('created_at', 'updated_at')
+
+    def to_internal_value(self, data):
+        # В multipart/form-data список ингредиентов передаётся JSON-строкой
+        if isinstance(data, QueryDict):
+            data = data.dict()
+            ingredients = data.get('ingredients')
+            if isinstance(ingredients, str):
+                try:
+                    data['ingredients'] = json.loads(ingredients)
+                except ValueError:
+                    raise serializers.ValidationError(
+                        {'ingredients': ['Invalid JSON.']})
+        return super().to_internal_value(data)
+
+    def to_representation(self, instance):
+        # Пробрасываем аннотацию автору, чтобы UserSerializer не ходил в БД
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        # После create и update ингредиенты не предзагружены
+        if 'ingredients' not in getattr(
+                instance, '_prefetched_objects_cache', {}):
+            models.prefetch_related_objects([instance], models.Prefetch(
+                'ingredients',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'),
+            ))
+        return super().to_representation(instance)
 
     def get_is_favorited(self, obj: Recipe):
+        # Аннотация из RecipeViewSet.annotate_queryset
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+
         user = None
         request = self.context.get('request')
         if request and hasattr(request, 'user'):
@@ -113,6 +270,9 @@ class RecipeSerializer(serializers.ModelSerializer):
         return False
 
     def get_is_in_shopping_cart(self, obj: Recipe):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+
         user = None
         request = self.context.get('request')
         if request and hasattr(request, 'user'):
@@ -121,21 +281,67 @@ class RecipeSerializer(serializers.ModelSerializer):
             return user.user_carts.filter(recipe=obj).exists()
         return False
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients')
         instance = Recipe.objects.create(**validated_data)
-        self.update_or_create(instance, ingredients_data)
+        RecipeIngredient.objects.bulk_create(
+            [RecipeIngredient(recipe=instance, **i) for i in ingredients_data])
         return instance
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('ingredients')
-        instance.ingredients.all().delete()
-        self.update_or_create(instance, ingredients_data)
+        ingredients_changed = self.update_ingredients(
+            instance, ingredients_data)
+
+        changed = [
+            name for name, value in validated_data.items()
+            if getattr(instance, name) != value
+        ]
+        # Сохранение рецепта обновляет updated_at и сбрасывает кэши через
+        # сигналы, поэтому оно нужно и при изменении одних ингредиентов
+        if changed or ingredients_changed:
+            for name in changed:
+                setattr(instance, name, validated_data[name])
+            instance.save()
         return instance
 
-    def update_or_create(self, instance, ingredients_data):
-        RecipeIngredient.objects.bulk_create(
-            [RecipeIngredient(recipe=instance, **i) for i in ingredients_data])
+    def update_ingredients(self, instance, ingredients_data) -> bool:
+        """Меняет только отличающиеся строки RecipeIngredient. Возвращает,
+        было ли что-то изменено."""
+        existing = {x.ingredient_id: x for x in RecipeIngredient.objects
+                    .filter(recipe=instance)}
+        old = {id: x.amount for id, x in existing.items()}
+        new = {x['ingredient'].pk: x['amount'] for x in ingredients_data}
+
+        to_create = [
+            RecipeIngredient(recipe=instance, ingredient_id=id, amount=amount)
+            for id, amount in new.items() if id not in existing
+        ]
+        to_update = []
+        for id, amount in new.items():
+            if id in existing and existing[id].amount != amount:
+                existing[id].amount = amount
+                to_update.append(existing[id])
+        to_delete = [x.pk for id, x in existing.items() if id not in new]
+
+        if to_delete:
+            # Как bulk_update и bulk_create - без сигналов: QuerySet.delete()
+            # из-за них загрузил бы строки и для каждой обновил рецепт и
+            # журнал (touch_recipe). Рецепт один раз сохраняет update(). На
+            # строки ингредиентов рецепта ничего не ссылается
+            query = RecipeIngredient.objects.filter(pk__in=to_delete)
+            query._raw_delete(query.db)
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+        if to_create:
+            RecipeIngredient.objects.bulk_create(to_create)
+
+        if not (to_create or to_update or to_delete):
+            return False
+        shopping_lists.update_recipe_ingredients(instance, old, new)
+        return True
 
     def validate_ingredients(self, value):
         seen = set()
@@ -163,9 +369,11 @@ class PartialUpdateRecipeSerializer(RecipeSerializer):
 
 
 class RecipeMinifiedSerializer(serializers.ModelSerializer):
+    image_renditions = ImageRenditionsField(source='image')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
 
 
 class UserWithRecipesSerializer(UserSerializer):
@@ -182,19 +390,36 @@ class UserWithRecipesSerializer(UserSerializer):
         super().__init__(*args, **kwargs)
 
     def get_recipes(self, obj: User):
-        recipes = obj.recipes.all().order_by('id')[:self.recipes_limit]
+        # Предзагружено в SubscriptionViewSet.get_queryset
+        if hasattr(obj, 'limited_recipes'):
+            recipes = obj.limited_recipes
+        else:
+            recipes = obj.recipes.all().order_by('id')[:self.recipes_limit]
         return RecipeMinifiedSerializer(recipes, many=True).data
 
     def get_recipes_count(self, obj: User):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
 
 
-class ShortLinkSerializer(serializers.ModelSerializer):
-    short_link = serializers.SerializerMethodField()
+class ShoppingListItemSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='ingredient.id')
+    name = serializers.CharField(source='ingredient.name')
+    measurement_unit = serializers.CharField(
+        source='ingredient.measurement_unit')
+    amount = serializers.IntegerField(source='total_amount')
+    recipes_count = serializers.IntegerField(source='recipe_count')
 
     class Meta:
-        model = ShortLink
-        fields = ('short_link',)
+        model = ShoppingListItem
+        fields = ('id', 'name', 'measurement_unit', 'amount', 'recipes_count')
+
+
+class ShortLinkSerializer(serializers.Serializer):
+    """Принимает код короткой ссылки (api.short_codes)."""
+
+    short_link = serializers.SerializerMethodField()
 
     @property
     def data(self):
@@ -202,15 +427,37 @@ class ShortLinkSerializer(serializers.ModelSerializer):
         data['short-link'] = data.pop('short_link')
         return data
 
-    def get_short_link(self, obj: ShortLink):
+    def get_short_link(self, obj: str):
         request = self.context['request']
-        short_link = obj[0].short_link
-        reversed_link = reverse('short-link-redirect', args=(short_link,))
+        reversed_link = reverse('short-link-redirect', args=(obj,))
         base_uri = request.build_absolute_uri('/')
         destination = urljoin(base_uri, reversed_link)
         return destination
 
 
+class IdListSerializer(serializers.Serializer):
+    """Тело запросов к пакетным действиям (избранное, корзина, подписки)."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=constants.MAX_BULK_IDS,
+    )
+
+    def validate_ids(self, value):
+        # Все объекты ищутся одним запросом
+        queryset = self.context['queryset']
+        existing = set(queryset.filter(pk__in=value)
+                       .values_list('pk', flat=True))
+        missing = [x for x in value if x not in existing]
+        if missing:
+            raise serializers.ValidationError([
+                f'Invalid pk "{x}" - object does not exist.'
+                for x in missing
+            ])
+        return list(dict.fromkeys(value))
+
+
 class UserSubscribeQuerySerializer(serializers.Serializer):
     recipes_limit = serializers.IntegerField(required=False, min_value=0)
 
@@ -220,6 +467,29 @@ class UserSubscriptionsQuerySerializer(serializers.Serializer):
     recipes_limit = serializers.IntegerField(required=False, min_value=0)
 
 
+class ChangeTokenField(serializers.Field):
+    default_error_messages = {'invalid': 'Invalid sync token.'}
+
+    def to_internal_value(self, data):
+        try:
+            return changelog.Token.parse(str(data))
+        except ValueError:
+            self.fail('invalid')
+
+    def to_representation(self, value):
+        return str(value)
+
+
+class RecipeChangesQuerySerializer(serializers.Serializer):
+    token = ChangeTokenField(required=False, default=changelog.Token())
+    limit = serializers.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=1000,
+        default=500,
+    )
+
+
 class RecipesQuerySerializer(serializers.Serializer):
     is_favorited = serializers.BooleanField(
         required=False,
@@ -1,100 +1,79 @@
-from foodgram.models import (
-    Ingredient,
-    Recipe as RecipeModel,
-    RecipeIngredient as RecipeIngredientModel,
-)
-from functools import lru_cache
-from typing import Iterable
+from typing import Iterable, Iterator
 
 
 class RecipeIngredient:
-    ingredient: Ingredient
+    name: str
+    measurement_unit: str
     amount: int
 
-    def __init__(self, model: RecipeIngredientModel):
-        self.ingredient = model.ingredient
-        self.amount = model.amount
+    def __init__(self, name: str, measurement_unit: str, amount: int):
+        self.name = name
+        self.measurement_unit = measurement_unit
+        self.amount = amount
 
 
 class Recipe:
     name: str
     ingredients: Iterable[RecipeIngredient]
 
-    def __init__(self, model: RecipeModel):
-        self.name = model.name
-        self.ingredients = sorted(
-            (RecipeIngredient(x) for x in model.ingredients.all()),
-            key=lambda x: x.ingredient.name.lower(),
-        )
+    def __init__(self, name: str, ingredients: Iterable[RecipeIngredient]):
+        self.name = name
+        self.ingredients = ingredients
 
 
 class ShoppingCartGenerator:
-    def __init__(self, recipes: Iterable[Recipe]):
+    """Рендерит список покупок по частям.
+
+    Все аргументы могут быть ленивыми итераторами, каждый из них читается
+    ровно один раз:
+    - ``ingredients`` - итоговое количество каждого ингредиента;
+    - ``recipe_names`` - оглавление, только непустые рецепты;
+    - ``recipes`` - разделы рецептов в том же порядке, что и оглавление.
+    """
+
+    def __init__(self,
+                 ingredients: Iterable[RecipeIngredient],
+                 recipe_names: Iterable[str],
+                 recipes: Iterable[Recipe]):
+        self.ingredients = ingredients
+        self.recipe_names = recipe_names
         self.recipes = recipes
 
     def render_ingredient(self, ingredient: RecipeIngredient):
         return (
-            f'- {ingredient.ingredient.name.capitalize()} —'
+            f'- {ingredient.name.capitalize()} —'
             f' {ingredient.amount}'
-            f' {ingredient.ingredient.measurement_unit}'
+            f' {ingredient.measurement_unit}'
         )
 
-    @lru_cache
-    def __str__(self):
-        ingredients_dict = {}  # type: dict[int, RecipeIngredient]
+    def iter_render(self) -> Iterator[str]:
+        yield '# Список покупок\n\n## Ингредиенты\n'
+        for ingredient in self.ingredients:
+            yield self.render_ingredient(ingredient) + '\n'
 
-        non_empty_recipes_count = 0
-        recipes_contents_render = ''
-        recipes_list_render = ''
+        yield '\n## Рецепты\n'
+        for i, name in enumerate(self.recipe_names, 1):
+            yield f'{i}. {name}\n'
 
         for recipe in self.recipes:
-            recipe_render = ''
-
-            ingredient_count = 0
+            yield f'\n### {recipe.name}\n'
             for ingredient in recipe.ingredients:
-                ingredient_count += 1
-
-                recipe_render += self.render_ingredient(ingredient) + '\n'
-
-                id = ingredient.ingredient.id
-                if id in ingredients_dict:
-                    ingredients_dict[id].amount += ingredient.amount
-                else:
-                    ingredients_dict[id] = ingredient
-
-            if ingredient_count == 0:
-                continue
-
-            non_empty_recipes_count += 1
-            if recipes_contents_render != '':
-                recipes_contents_render += '\n'
-            recipes_contents_render += (
-                f'{non_empty_recipes_count}. {recipe.name}'
-            )
-            recipe_render = f'### {recipe.name}\n' + recipe_render
-            recipes_list_render += recipe_render + '\n'
-
-        ingredient_list_render = '\n'.join(map(
-            self.render_ingredient,
-            sorted(
-                ingredients_dict.values(),
-                key=lambda x: x.ingredient.name.lower(),
-            ),
-        ))
-
-        if non_empty_recipes_count > 0:
-            recipes_contents_render = recipes_contents_render + '\n'
-            ingredient_list_render = ingredient_list_render + '\n'
-            recipes_list_render = recipes_list_render + '\n'
-
-        render = (
-            '# Список покупок\n'
-            '\n'
-            '## Ингредиенты\n'
-            f'{ingredient_list_render}\n'
-            '## Рецепты\n'
-            f'{recipes_contents_render}\n'
-            f'{recipes_list_render}\n'
-        )
+                yield self.render_ingredient(ingredient) + '\n'
+
+    def chunks(self, chunk_size: int = 8192) -> Iterator[str]:
+        """Склеивает вывод iter_render в куски примерно по chunk_size
+        символов, чтобы не отдавать ответ построчно."""
+        buffer = []
+        size = 0
+        for part in self.iter_render():
+            buffer.append(part)
+            size += len(part)
+            if size >= chunk_size:
+                yield ''.join(buffer)
+                buffer.clear()
+                size = 0
+        if buffer:
+            yield ''.join(buffer)
 
-        return render.rstrip() + '\n'
+    def __str__(self):
+        return ''.join(self.iter_render())
@@ -0,0 +1,323 @@
+"""Короткие ссылки на рецепты без обращений к БД.
+
+Код - id рецепта, переставленный ключевой перестановкой (сеть Фейстеля
+с ключом из SECRET_KEY) и записанный в base62 фиксированной длины
+CODE_LENGTH. Такой код восстанавливается в id без таблицы, а соседние id
+не дают соседних кодов. Смена SECRET_KEY меняет все коды.
+
+Код ведёт на рецепт, только если рецепт существует: id существующих
+рецептов хранятся в памяти процесса (RecipeIds) и перечитываются, когда
+сигналы сбрасывают их версию в общем кэше. Иначе любая строка из
+CODE_LENGTH символов base62 с небольшим значением считалась бы кодом.
+
+Старые коды из таблицы ShortLink продолжают работать: они короче
+CODE_LENGTH и ищутся через LRU-кэш процесса и общий кэш Django.
+
+Переходы по ссылкам считаются в памяти процесса и записываются в
+ShortLinkHits пачками из фонового потока (HitCounter).
+"""
+from asgiref.sync import sync_to_async
+from collections import Counter, OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import (
+    DEFAULT_DB_ALIAS,
+    connection,
+    connections,
+    transaction,
+)
+from django.utils.crypto import salted_hmac
+import atexit
+import hashlib
+import hmac
+import logging
+import os
+import string
+import threading
+import time
+import uuid
+
+from foodgram.models import Recipe, ShortLink, ShortLinkHits
+
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+ALPHABET = string.digits + string.ascii_letters
+CODE_LENGTH = 6
+# Две половины по 17 бит: 2^34 < 62^6, любой код помещается в 6 символов
+HALF_BITS = 17
+HALF_MASK = (1 << HALF_BITS) - 1
+MAX_ID = (1 << (2 * HALF_BITS)) - 1
+ROUNDS = 4
+
+RECIPE_IDS_VERSION_KEY = 'short-links:recipe-ids:version'
+# Сколько разных кодов держит буфер переходов до записи в БД
+MAX_BUFFERED_CODES = 10000
+
+
+def _round_keys() -> list[bytes]:
+    return [
+        salted_hmac('foodgram.short-codes', str(i)).digest()
+        for i in range(ROUNDS)
+    ]
+
+
+_keys = None
+
+
+def _round(key: bytes, value: int) -> int:
+    digest = hmac.new(key, value.to_bytes(3, 'big'), hashlib.sha256).digest()
+    return int.from_bytes(digest[:3], 'big') & HALF_MASK
+
+
+def _permute(value: int, reverse: bool = False) -> int:
+    global _keys
+    if _keys is None:
+        _keys = _round_keys()
+    left, right = value >> HALF_BITS, value & HALF_MASK
+    if not reverse:
+        for key in _keys:
+            left, right = right, left ^ _round(key, right)
+    else:
+        for key in reversed(_keys):
+            left, right = right ^ _round(key, left), left
+    return (left << HALF_BITS) | right
+
+
+def encode(recipe_id: int) -> str:
+    if not 0 <= recipe_id <= MAX_ID:
+        raise ValueError(f'recipe id {recipe_id} is out of range')
+    value = _permute(recipe_id)
+    chars = []
+    for _ in range(CODE_LENGTH):
+        value, digit = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+def decode(code: str) -> int | None:
+    """id рецепта по коду или None, если это не код вида encode."""
+    if len(code) != CODE_LENGTH:
+        return None
+    value = 0
+    for char in code:
+        digit = ALPHABET.find(char)
+        if digit == -1:
+            return None
+        value = value * len(ALPHABET) + digit
+    if value > MAX_ID:
+        return None
+    return _permute(value, reverse=True)
+
+
+class LRUCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.items:
+                return default
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            if len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+
+class RecipeIds:
+    """id существующих рецептов в памяти процесса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.ids = frozenset()
+
+    def load(self, version: str):
+        # Из основной БД, как и каталог ингредиентов: отставшая реплика
+        # закэшировала бы старый набор под новой версией
+        self.ids = frozenset(Recipe.objects.using(
+            DEFAULT_DB_ALIAS).values_list('pk', flat=True))
+        self.version = version
+
+    def refresh(self):
+        version = get_recipe_ids_version()
+        if version == self.version:
+            return
+        with self.lock:
+            if version != self.version:
+                self.load(version)
+
+    async def arefresh(self):
+        version = await cache.aget(RECIPE_IDS_VERSION_KEY)
+        if version is None or version != self.version:
+            await sync_to_async(self.refresh)()
+
+    def exists(self, recipe_id: int) -> bool:
+        self.refresh()
+        return recipe_id in self.ids
+
+    async def aexists(self, recipe_id: int) -> bool:
+        await self.arefresh()
+        return recipe_id in self.ids
+
+
+def bump_recipe_ids_version():
+    cache.set(RECIPE_IDS_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def get_recipe_ids_version() -> str:
+    version = cache.get(RECIPE_IDS_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(RECIPE_IDS_VERSION_KEY, version, None):
+            version = cache.get(RECIPE_IDS_VERSION_KEY, version)
+    return version
+
+
+recipe_ids = RecipeIds()
+
+_legacy_destinations = LRUCache(max_size=4096)
+# Отсутствующий код тоже кэшируется, чтобы перебор кодов не шёл в БД
+_MISSING = ''
+
+
+def resolve(code: str) -> str | None:
+    """Путь на сайте, куда ведёт код, или None."""
+    recipe_id = decode(code)
+    if recipe_id is not None:
+        if not recipe_ids.exists(recipe_id):
+            return None
+        return f'/recipes/{recipe_id}'
+    return resolve_legacy(code)
+
+
+def resolve_legacy(code: str) -> str | None:
+    destination = _legacy_destinations.get(code)
+    if destination is None:
+        key = f'short-link:{code}'
+        destination = cache.get(key)
+        metrics.record_cache('short_link', hit=destination is not None)
+        if destination is None:
+            destination = ShortLink.objects.filter(pk=code).values_list(
+                'destination', flat=True).first() or _MISSING
+            cache.set(key, destination, settings.SHORT_LINK_CACHE_TIMEOUT)
+        _legacy_destinations.set(code, destination)
+    return destination or None
+
+
+async def aresolve(code: str) -> str | None:
+    """resolve для асинхронных представлений."""
+    recipe_id = decode(code)
+    if recipe_id is not None:
+        if not await recipe_ids.aexists(recipe_id):
+            return None
+        return f'/recipes/{recipe_id}'
+    return await aresolve_legacy(code)
+
+
+async def aresolve_legacy(code: str) -> str | None:
+    destination = _legacy_destinations.get(code)
+    if destination is None:
+        key = f'short-link:{code}'
+        destination = await cache.aget(key)
+        metrics.record_cache('short_link', hit=destination is not None)
+        if destination is None:
+            destination = await ShortLink.objects.filter(
+                pk=code).values_list('destination', flat=True).afirst()
+            destination = destination or _MISSING
+            await cache.aset(
+                key, destination, settings.SHORT_LINK_CACHE_TIMEOUT)
+        _legacy_destinations.set(code, destination)
+    return destination or None
+
+
+class HitCounter:
+    """Буфер переходов по ссылкам. Запрос только увеличивает счётчик в
+    памяти, а в БД буфер раз в SHORT_LINK_HITS_FLUSH_INTERVAL секунд
+    сбрасывает фоновый поток процесса.
+
+    В буфере не больше MAX_BUFFERED_CODES разных кодов: когда он полон,
+    поток сбрасывает его сразу, а переходы по новым кодам до этого не
+    учитываются."""
+
+    def __init__(self):
+        self.hits = Counter()
+        self.lock = threading.Lock()
+        self.full = threading.Event()
+        self.thread = None
+        self.pid = None
+
+    def add(self, code: str):
+        """Учитывает переход; к БД не обращается."""
+        with self.lock:
+            if code in self.hits or len(self.hits) < MAX_BUFFERED_CODES:
+                self.hits[code] += 1
+            else:
+                self.full.set()
+            # Поток запускается в каждом воркере: после fork потоков
+            # родителя в нём нет
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.thread = threading.Thread(
+                    target=self.run, name='short-link-hits', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        interval = max(settings.SHORT_LINK_HITS_FLUSH_INTERVAL, 1)
+        while True:
+            self.full.wait(interval)
+            self.full.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to write short link hits')
+                # Полный буфер не должен превращать ошибки БД в цикл
+                time.sleep(interval)
+            finally:
+                # Соединения фоновых потоков сами не закрываются
+                connections.close_all()
+
+    def flush(self):
+        with self.lock:
+            hits, self.hits = self.hits, Counter()
+        if not hits:
+            return
+        try:
+            self.write(hits)
+        except Exception:
+            # Вернём в буфер, чтобы записать со следующей пачкой
+            with self.lock:
+                self.hits.update(hits)
+            raise
+
+    @staticmethod
+    def write(hits: Counter):
+        table = connection.ops.quote_name(ShortLinkHits._meta.db_table)
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Поддерживается и PostgreSQL, и SQLite
+            cursor.executemany(
+                f'INSERT INTO {table} (code, hits) VALUES (%s, %s)'
+                f' ON CONFLICT (code)'
+                f' DO UPDATE SET hits = {table}.hits + EXCLUDED.hits',
+                sorted(hits.items()),
+            )
+
+
+hit_counter = HitCounter()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        hit_counter.flush()
+    except Exception:
+        logger.exception('Failed to write short link hits')
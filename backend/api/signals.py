@@ -0,0 +1,149 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from foodgram import changelog, images, memberships, shopping_lists
+from foodgram.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Subscription,
+    User,
+)
+
+from . import (
+    authentication,
+    ingredient_catalog,
+    response_cache,
+    short_codes,
+)
+from .pagination import COUNTED_MODELS, bump_count_version
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def invalidate_ingredient_catalog(sender, **kwargs):
+    ingredient_catalog.bump_version()
+
+
+def invalidate_counts(sender, **kwargs):
+    bump_count_version(sender)
+
+
+for model in COUNTED_MODELS:
+    post_save.connect(invalidate_counts, sender=model)
+    post_delete.connect(invalidate_counts, sender=model)
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+@receiver([post_save, post_delete], sender=Ingredient)
+@receiver([post_save, post_delete], sender=User)
+def invalidate_anonymous_cache(sender, update_fields=None, **kwargs):
+    # Вход пользователя обновляет только last_login, на ответы это не влияет
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    response_cache.bump_version()
+
+
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+def touch_recipe(sender, instance, **kwargs):
+    # Ингредиенты - часть ответа о рецепте, его Last-Modified и ETag
+    if Recipe.objects.filter(pk=instance.recipe_id).update(
+            updated_at=timezone.now()):
+        changelog.record(changelog.Kind.RECIPE, instance.recipe_id)
+
+
+@receiver(post_save, sender=Ingredient)
+def touch_ingredient_recipes(sender, instance, created, **kwargs):
+    if created:
+        return
+    recipes = Recipe.objects.filter(ingredients__ingredient=instance)
+    recipe_ids = list(recipes.values_list('pk', flat=True).distinct())
+    Recipe.objects.filter(pk__in=recipe_ids).update(updated_at=timezone.now())
+    changelog.record_many(changelog.Kind.RECIPE, recipe_ids)
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def invalidate_recipe_ids(sender, created=True, **kwargs):
+    # Набор id для коротких ссылок меняется только при создании и удалении
+    if created:
+        short_codes.bump_recipe_ids_version()
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_carts(sender, instance, **kwargs):
+    # Collector.delete отправляет pre_delete в своей транзакции, пока
+    # ингредиенты и корзины рецепта ещё не удалены
+    shopping_lists.remove_recipe_from_all_carts(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def log_recipe_saved(sender, instance, **kwargs):
+    changelog.record(changelog.Kind.RECIPE, instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def log_recipe_deleted(sender, instance, **kwargs):
+    changelog.record(changelog.Kind.RECIPE, instance.pk, deleted=True)
+
+
+def log_user_change(kind, object_field):
+    def receiver(sender, instance, **kwargs):
+        changelog.record(
+            kind,
+            getattr(instance, object_field),
+            user_id=instance.user_id,
+            deleted=kwargs['signal'] is post_delete,
+        )
+    return receiver
+
+
+for model, kind, object_field in (
+    (Favorite, changelog.Kind.FAVORITE, 'recipe_id'),
+    (ShoppingCart, changelog.Kind.SHOPPING_CART, 'recipe_id'),
+    (Subscription, changelog.Kind.SUBSCRIPTION, 'subscribed_to_id'),
+):
+    log_change = log_user_change(kind, object_field)
+    post_save.connect(log_change, sender=model, weak=False)
+    post_delete.connect(log_change, sender=model, weak=False)
+
+
+def schedule_renditions(sender, instance, **kwargs):
+    images.schedule(instance, images.IMAGE_FIELDS[sender])
+
+
+for model in images.IMAGE_FIELDS:
+    post_save.connect(schedule_renditions, sender=model)
+
+
+@receiver(images.renditions_ready)
+def renditions_ready(sender, pk, **kwargs):
+    # Копии меняют ссылки на картинки в ответах
+    response_cache.bump_version()
+    if sender is Recipe:
+        changelog.record(changelog.Kind.RECIPE, pk)
+
+
+@receiver(memberships.changed)
+def memberships_changed(sender, user_id, **kwargs):
+    # Пачки пишутся без сигналов моделей, сбрасываем то же, что и они
+    bump_count_version(sender)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    # В том числе выход через auth/token/logout
+    authentication.invalidate([instance.key])
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_tokens(sender, instance, update_fields=None, **kwargs):
+    # last_login в кэшированном пользователе ни на что не влияет
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    authentication.invalidate(
+        Token.objects.filter(user_id=instance.pk).values_list(
+            'key', flat=True))
@@ -0,0 +1,32 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.serializers import AvatarSerializer
+from foodgram.models import User
+
+
+class AvatarSaveTest(TestCase):
+    """Аватар сохраняется без остальных полей request.user, который может
+    быть устаревшей копией из кэша аутентификации."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='x',
+            first_name='Old', last_name='U')
+        # Имя поменяли в другом запросе, а self.user - копия из кэша
+        User.objects.filter(pk=self.user.pk).update(first_name='New')
+
+    def assertNameKept(self):
+        self.assertEqual(
+            User.objects.get(pk=self.user.pk).first_name, 'New')
+
+    def test_set_avatar(self):
+        AvatarSerializer().update(self.user, {})
+        self.assertNameKept()
+
+    def test_delete_avatar(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.delete('/api/users/me/avatar/')
+        self.assertEqual(response.status_code, 204)
+        self.assertNameKept()
@@ -0,0 +1,60 @@
+from datetime import timedelta
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from io import StringIO
+from rest_framework.test import APIClient
+
+from foodgram.models import ChangeLogEntry, Recipe, User
+
+
+class ChangeLogPruneTest(TestCase):
+    """Очистка журнала (prune_changelog): токен раньше границы получает
+    410 и токен для продолжения после полной синхронизации."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='x',
+            first_name='A', last_name='A')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def create_recipe(self, name):
+        return Recipe.objects.create(
+            author=self.author, name=name, text='Текст', cooking_time=10)
+
+    def changes(self, token):
+        return self.client.get('/api/recipes/changes/', {'token': token})
+
+    def prune(self):
+        call_command('prune_changelog', '--batch-size=1', stdout=StringIO())
+
+    def test_expired_token(self):
+        old = self.create_recipe('Старый')
+        ChangeLogEntry.objects.update(
+            created_at=timezone.now() - timedelta(days=365))
+        token = self.changes('0').json()['token']
+        fresh = self.create_recipe('Новый')
+
+        self.prune()
+        self.assertFalse(
+            ChangeLogEntry.objects.filter(object_id=old.pk).exists())
+
+        response = self.changes('0')
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.json()['token'], self.changes(
+            response.json()['token']).json()['token'])
+
+        # Токен с границы очистки продолжает работать
+        response = self.changes(token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [x['id'] for x in response.json()['recipes']['updated']],
+            [fresh.pk])
+
+    def test_nothing_to_prune(self):
+        self.create_recipe('Новый')
+        self.prune()
+        self.assertEqual(self.changes('0').status_code, 200)
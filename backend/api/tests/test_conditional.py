@@ -0,0 +1,48 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from foodgram.models import Recipe, User
+
+
+class RecipeValidatorsTest(TestCase):
+    """ETag списка и рецепта: анонимам - без запросов при попадании в кэш,
+    пользователю - с учётом его избранного (UserChangeState)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com', password='x',
+            first_name='U', last_name='U')
+        cls.recipe = Recipe.objects.create(
+            author=cls.user, name='Рецепт', text='Текст', cooking_time=10)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_anonymous_cache_hit_without_queries(self):
+        for url in ('/api/recipes/', f'/api/recipes/{self.recipe.pk}/'):
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    second = self.client.get(url)
+                self.assertEqual(len(queries), 0, [x['sql'] for x in queries])
+                self.assertEqual(second.status_code, 200)
+                self.assertEqual(second['ETag'], first['ETag'])
+
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=first['ETag'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_user_etag_follows_favorites(self):
+        self.client.force_authenticate(self.user)
+        url = f'/api/recipes/{self.recipe.pk}/'
+        etag = self.client.get(url)['ETag']
+        self.client.post(f'/api/recipes/{self.recipe.pk}/favorite/')
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['is_favorited'])
@@ -0,0 +1,53 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.pagination import KeysetPagination
+from foodgram.models import Subscription, User
+
+
+class SubscriptionCursorTest(TestCase):
+    """Переход по ссылкам next/previous курсорной пагинации подписок:
+    поля курсора - аннотации, а не поля модели."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='x',
+            first_name='R', last_name='R')
+        cls.authors = [
+            User.objects.create_user(
+                username=f'author{i}', email=f'author{i}@example.com',
+                password='x', first_name='A', last_name='A')
+            for i in range(5)
+        ]
+        for author in cls.authors:
+            Subscription.objects.create(user=cls.user, subscribed_to=author)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_follow_next_and_previous(self):
+        page = self.get('/api/users/subscriptions/', cursor='', limit=2)
+        pages = [[x['id'] for x in page['results']]]
+        while page['next']:
+            page = self.get(page['next'])
+            pages.append([x['id'] for x in page['results']])
+
+        expected = [x.pk for x in self.authors]
+        self.assertEqual(pages, [expected[:2], expected[2:4], expected[4:]])
+
+        page = self.get(page['previous'])
+        self.assertEqual([x['id'] for x in page['results']], expected[2:4])
+
+    def test_invalid_cursor_value(self):
+        # Нечитаемая дата в курсоре: 404, а не 500
+        cursor = KeysetPagination(('subscribed_at', 'subscription_id'), 2)
+        response = self.client.get('/api/users/subscriptions/', {
+            'cursor': cursor.encode_cursor(['not a date', 1], False)})
+        self.assertEqual(response.status_code, 404)
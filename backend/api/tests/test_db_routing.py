@@ -0,0 +1,107 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from foodgram import db_routing
+from foodgram.models import Recipe, User
+
+REPLICA = 'replica'
+
+
+@override_settings(
+    DATABASE_REPLICAS=[REPLICA],
+    DATABASE_ROUTERS=['foodgram.db_routing.ReplicaRouter'],
+)
+class ReplicaRoutingTest(TransactionTestCase):
+    """Чтение с реплики (foodgram.db_routing) на втором алиасе SQLite -
+    зеркале основной тестовой БД: по запросам на его соединении видно,
+    куда ушло чтение."""
+
+    @classmethod
+    def setUpClass(cls):
+        # DB_REPLICAS читается при загрузке настроек, поэтому алиас
+        # добавляется уже после создания тестовой БД и указывает на неё
+        connections.settings[REPLICA] = {
+            **connections[DEFAULT_DB_ALIAS].settings_dict,
+            'TEST': {'MIRROR': DEFAULT_DB_ALIAS},
+        }
+        cls.addClassCleanup(cls.remove_replica)
+        cls.databases = {DEFAULT_DB_ALIAS, REPLICA}
+        super().setUpClass()
+
+    @classmethod
+    def remove_replica(cls):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='x',
+            first_name='U', last_name='U')
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Рецепт', text='Текст', cooking_time=10)
+
+    def get(self, client, url):
+        """Ответ и SQL-запросы на основной БД и на реплике."""
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary, \
+                CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [x['sql'] for x in primary], [x['sql'] for x in replica]
+
+    def assertRecipeReads(self, queries):
+        self.assertTrue(
+            any(Recipe._meta.db_table in x for x in queries), queries)
+
+    def test_reads_go_to_replica(self):
+        client = APIClient()
+        for url in ('/api/recipes/', f'/api/recipes/{self.recipe.pk}/'):
+            with self.subTest(url=url):
+                primary, replica = self.get(client, url)
+                self.assertRecipeReads(replica)
+                self.assertFalse(
+                    any(Recipe._meta.db_table in x for x in primary),
+                    primary)
+
+    def test_reads_in_atomic_go_to_primary(self):
+        with transaction.atomic():
+            primary, replica = self.get(APIClient(), '/api/recipes/')
+        self.assertRecipeReads(primary)
+        self.assertEqual(replica, [])
+
+    def test_reads_after_write_go_to_primary(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = client.post(
+                f'/api/recipes/{self.recipe.pk}/favorite/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(replica), 0)
+
+        primary, replica = self.get(client, '/api/recipes/')
+        self.assertRecipeReads(primary)
+        self.assertEqual(replica, [])
+
+        # Метка только у того, кто писал
+        _, replica = self.get(APIClient(), '/api/recipes/')
+        self.assertRecipeReads(replica)
+
+    def test_writes_go_to_primary(self):
+        with db_routing.read_scope(), \
+                CaptureQueriesContext(connections[REPLICA]) as replica:
+            db_routing.allow_replica_reads(AnonymousUser())
+            recipe = Recipe.objects.create(
+                author=self.user, name='Другой', text='Текст',
+                cooking_time=5)
+            recipe.name = 'Переименован'
+            recipe.save(update_fields=['name'])
+            Recipe.objects.filter(pk=recipe.pk).delete()
+        self.assertFalse(
+            any(x['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+                for x in replica.captured_queries),
+            replica.captured_queries)
@@ -0,0 +1,56 @@
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+import warnings
+
+from foodgram import memberships
+from foodgram.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    User,
+)
+
+
+class DownloadShoppingCartTest(TestCase):
+    """Список покупок отдаётся по частям и под WSGI, и под ASGI, где
+    синхронный итератор Django собрал бы целиком (api.views.stream_content).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com', password='x',
+            first_name='U', last_name='U')
+        cls.token = Token.objects.create(user=cls.user)
+        ingredient = Ingredient.objects.create(
+            name='Мука', measurement_unit='г')
+        recipe = Recipe.objects.create(
+            author=cls.user, name='Блины', text='Текст', cooking_time=10)
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=ingredient, amount=200)
+        memberships.add(ShoppingCart, cls.user, [recipe.pk])
+
+    url = '/api/recipes/download_shopping_cart/'
+
+    def assertShoppingList(self, content: bytes):
+        text = content.decode()
+        self.assertIn('Мука', text)
+        self.assertIn('Блины', text)
+
+    def test_wsgi(self):
+        response = self.client.get(
+            self.url, HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.is_async)
+        self.assertShoppingList(b''.join(response.streaming_content))
+
+    async def test_asgi(self):
+        response = await self.async_client.get(
+            self.url, headers={'Authorization': f'Token {self.token.key}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            content = b''.join([x async for x in response.streaming_content])
+        self.assertShoppingList(content)
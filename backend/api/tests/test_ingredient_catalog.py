@@ -0,0 +1,38 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api import ingredient_catalog
+from foodgram.models import Ingredient
+
+
+class IngredientCatalogSearchTest(TestCase):
+    """Поиск ?name= по каталогу в памяти: без учёта регистра, ё = е."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('Молоко', 'молотый перец', 'Ёжевика', 'мука'))
+
+    def setUp(self):
+        # bulk_create не отправляет сигналы, сбрасывающие версию
+        ingredient_catalog.bump_version()
+        self.client = APIClient()
+
+    def search(self, name: str) -> list[str]:
+        response = self.client.get('/api/ingredients/', {'name': name})
+        self.assertEqual(response.status_code, 200)
+        return [x['name'] for x in response.json()]
+
+    def test_case_insensitive(self):
+        self.assertEqual(self.search('Мол'), ['Молоко', 'молотый перец'])
+        self.assertEqual(self.search('мол'), ['Молоко', 'молотый перец'])
+
+    def test_yo(self):
+        self.assertEqual(self.search('еж'), ['Ёжевика'])
+
+    def test_full_list_in_model_order(self):
+        response = self.client.get('/api/ingredients/')
+        self.assertEqual(
+            [x['name'] for x in response.json()],
+            list(Ingredient.objects.values_list('name', flat=True)))
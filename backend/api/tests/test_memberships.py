@@ -0,0 +1,55 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from foodgram.models import ChangeLogEntry, Favorite, Recipe, User
+
+
+class FavoriteRemoveTest(TestCase):
+    """Удаление связей: один DELETE и одна запись журнала на пачку
+    (foodgram.memberships.remove)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com', password='x',
+            first_name='U', last_name='U')
+        cls.recipes = Recipe.objects.bulk_create(
+            Recipe(author=cls.user, name=f'Рецепт {i}', text='Текст',
+                   cooking_time=10)
+            for i in range(20))
+        Favorite.objects.bulk_create(
+            Favorite(user=cls.user, recipe=x) for x in cls.recipes)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_remove(self):
+        ids = [x.pk for x in self.recipes]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(
+                '/api/recipes/favorite/', {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(response.json()['removed']), ids)
+
+        statements = [x['sql'] for x in queries]
+        self.assertEqual(
+            sum(x.startswith('DELETE') for x in statements), 1)
+        self.assertEqual(sum(
+            x.startswith('INSERT') and ChangeLogEntry._meta.db_table in x
+            for x in statements), 1)
+        self.assertFalse(Favorite.objects.exists())
+        self.assertEqual(
+            ChangeLogEntry.objects.filter(
+                kind=ChangeLogEntry.Kind.FAVORITE, deleted=True).count(),
+            len(ids))
+
+    def test_remove_one(self):
+        recipe = self.recipes[0]
+        url = f'/api/recipes/{recipe.pk}/favorite/'
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 400)
+        self.assertEqual(
+            self.client.delete('/api/recipes/0/favorite/').status_code, 404)
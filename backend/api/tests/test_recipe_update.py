@@ -0,0 +1,86 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from foodgram.models import Ingredient, Recipe, RecipeIngredient, User
+
+
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class RecipeUpdateWritesTest(TestCase):
+    """PATCH рецепта пишет в БД только то, что изменилось
+    (RecipeSerializer.update_ingredients)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='x',
+            first_name='A', last_name='B')
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(3))
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', text='Текст', cooking_time=10)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=cls.recipe, ingredient=x, amount=10)
+            for x in cls.ingredients[:2])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def patch(self, amounts: dict):
+        data = {
+            'name': 'Рецепт',
+            'text': 'Текст',
+            'cooking_time': 10,
+            'ingredients': [
+                {'id': self.ingredients[i].pk, 'amount': amount}
+                for i, amount in amounts.items()
+            ],
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.pk}/', data, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [
+            x['sql'] for x in queries.captured_queries
+            if x['sql'].lstrip().upper().startswith(WRITES)
+        ]
+
+    def amounts(self) -> dict:
+        return dict(RecipeIngredient.objects.filter(recipe=self.recipe)
+                    .values_list('ingredient_id', 'amount'))
+
+    def test_unchanged_patch_writes_nothing(self):
+        self.assertEqual(self.patch({0: 10, 1: 10}), [])
+
+    def test_ingredients_removed(self):
+        writes = self.patch({0: 10})
+
+        self.assertEqual(len(writes), 3, writes)
+        self.assertEqual(self.amounts(), {self.ingredients[0].pk: 10})
+
+    def test_one_amount_changed(self):
+        writes = self.patch({0: 10, 1: 20})
+
+        # UPDATE строки ингредиента, сохранение рецепта и запись в журнал
+        # изменений
+        self.assertEqual(len(writes), 3, writes)
+        self.assertEqual(self.amounts(), {
+            self.ingredients[0].pk: 10,
+            self.ingredients[1].pk: 20,
+        })
+
+    def test_ingredient_replaced(self):
+        writes = self.patch({0: 10, 2: 5})
+
+        # DELETE и INSERT строк ингредиентов, сохранение рецепта и запись в
+        # журнал изменений - без записей по каждой удалённой строке
+        self.assertEqual(len(writes), 4, writes)
+        self.assertEqual(self.amounts(), {
+            self.ingredients[0].pk: 10,
+            self.ingredients[2].pk: 5,
+        })
@@ -0,0 +1,69 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from foodgram import memberships, shopping_lists
+from foodgram.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingListItem,
+    User,
+)
+
+
+class RecipeDeleteShoppingListTest(TestCase):
+    """Итоги списков покупок после удаления рецепта любым способом
+    совпадают с пересчётом с нуля (foodgram.shopping_lists)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='x',
+            first_name='A', last_name='A')
+        cls.buyer = User.objects.create_user(
+            username='buyer', email='buyer@example.com', password='x',
+            first_name='B', last_name='B')
+        cls.ingredient = Ingredient.objects.create(
+            name='Мука', measurement_unit='г')
+
+    def setUp(self):
+        self.recipes = [
+            Recipe.objects.create(
+                author=self.author, name=f'Рецепт {i}', text='Текст',
+                cooking_time=10)
+            for i in range(2)
+        ]
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=x, ingredient=self.ingredient, amount=100)
+            for x in self.recipes)
+        memberships.add(
+            ShoppingCart, self.buyer, [x.pk for x in self.recipes])
+
+    def assertListsInSync(self):
+        self.assertEqual(
+            {
+                (x.user_id, x.ingredient_id): [x.total_amount, x.recipe_count]
+                for x in ShoppingListItem.objects.all()
+            },
+            shopping_lists.compute(),
+        )
+
+    def test_api_delete(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.delete(f'/api/recipes/{self.recipes[0].pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertListsInSync()
+        self.assertEqual(ShoppingListItem.objects.get().total_amount, 100)
+
+    def test_orm_delete(self):
+        # Так удаляет админка
+        Recipe.objects.filter(pk=self.recipes[0].pk).delete()
+        self.assertListsInSync()
+
+    def test_author_delete(self):
+        self.author.delete()
+        self.assertListsInSync()
+        self.assertFalse(ShoppingListItem.objects.exists())
@@ -0,0 +1,48 @@
+from django.test import TestCase
+import os
+
+from api import short_codes
+from foodgram.models import Recipe, User
+
+
+class ShortLinkRedirectTest(TestCase):
+    """Коды ведут только на существующие рецепты и только их переходы
+    попадают в буфер HitCounter."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='x',
+            first_name='A', last_name='B')
+
+    def setUp(self):
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Текст', cooking_time=10)
+        short_codes.hit_counter.hits.clear()
+
+    def test_existing_recipe(self):
+        code = short_codes.encode(self.recipe.pk)
+        response = self.client.get(f'/s/{code}/')
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(
+            response['Location'].endswith(f'/recipes/{self.recipe.pk}'))
+        self.assertEqual(short_codes.hit_counter.hits[code], 1)
+
+    def test_missing_recipe(self):
+        codes = [
+            short_codes.encode(self.recipe.pk),
+            short_codes.encode(self.recipe.pk + 1000),
+        ]
+        self.recipe.delete()
+        for code in codes:
+            self.assertEqual(self.client.get(f'/s/{code}/').status_code, 404)
+        self.assertFalse(short_codes.hit_counter.hits)
+
+    def test_buffer_is_bounded(self):
+        counter = short_codes.HitCounter()
+        counter.hits.update(
+            str(i) for i in range(short_codes.MAX_BUFFERED_CODES))
+        counter.pid = os.getpid()
+        counter.add('new')
+        self.assertNotIn('new', counter.hits)
+        self.assertTrue(counter.full.is_set())
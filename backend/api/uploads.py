@@ -0,0 +1,65 @@
+"""Приём картинок без лишних копий в памяти.
+
+Строка base64 из JSON декодируется по частям: небольшие картинки в память,
+остальные во временный файл, как это делают обработчики загрузки Django
+для multipart/form-data.
+"""
+from django.conf import settings
+from django.core.files.uploadedfile import (
+    InMemoryUploadedFile,
+    TemporaryUploadedFile,
+)
+from io import BytesIO
+import base64
+import binascii
+
+
+class IncrementalBase64Decoder:
+    """Декодирует base64 по частям произвольной длины."""
+
+    def __init__(self):
+        self.tail = ''
+
+    def decode(self, chunk: str) -> bytes:
+        # Пробельные символы допускаются внутри строки и пропускаются
+        chunk = self.tail + ''.join(chunk.split())
+        cut = len(chunk) - len(chunk) % 4
+        self.tail = chunk[cut:]
+        return base64.b64decode(chunk[:cut], validate=True)
+
+    def finish(self):
+        if self.tail:
+            raise binascii.Error('Incorrect padding')
+
+
+def decoded_size(data: str, start: int) -> int:
+    """Размер данных после декодирования base64, начиная с позиции start
+    (без учёта пробельных символов - оценка сверху)."""
+    length = len(data) - start
+    padding = data.count('=', max(start, len(data) - 2))
+    return length // 4 * 3 - padding
+
+
+def decode_base64_file(data: str, start: int, name: str, content_type: str,
+                       chunk_size: int = 64 * 1024):
+    """Декодирует data[start:] в загруженный файл.
+
+    Бросает binascii.Error, если строка не является корректным base64.
+    """
+    size = decoded_size(data, start)
+    if size <= settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+        file = InMemoryUploadedFile(
+            BytesIO(), None, name, content_type, None, None)
+    else:
+        file = TemporaryUploadedFile(name, content_type, None, None)
+
+    decoder = IncrementalBase64Decoder()
+    written = 0
+    for offset in range(start, len(data), chunk_size):
+        written += file.write(
+            decoder.decode(data[offset:offset + chunk_size]))
+    decoder.finish()
+
+    file.size = written
+    file.seek(0)
+    return file
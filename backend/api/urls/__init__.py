@@ -1,8 +1,10 @@
-from django.urls import include, path
+from django.conf import settings
+from django.urls import include, path, re_path
 from rest_framework import routers
 
 from ..views import (
     CurrentUserViewSet,
+    DatabaseStatusView,
     IngredientViewSet,
     RecipeViewSet,
     SubscriptionViewSet,
@@ -24,5 +26,19 @@ router.register('recipes', RecipeViewSet)
 urlpatterns = [
     # path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
+    path('status/db/', DatabaseStatusView.as_view(), name='status-db'),
     path('', include(router.urls)),
 ]
+
+if settings.ASYNC_VIEWS:
+    from .. import async_views
+
+    # Те же адреса, что у router, но раньше него и без имён: reverse
+    # по-прежнему возвращает адреса router. pk только из цифр, чтобы не
+    # перехватить действия вроде recipes/download_shopping_cart/
+    urlpatterns[:0] = [
+        re_path(r'^users/subscriptions/$', async_views.subscription_list),
+        re_path(r'^ingredients/$', async_views.ingredient_list),
+        re_path(r'^recipes/$', async_views.recipe_list),
+        re_path(r'^recipes/(?P<pk>\d+)/$', async_views.recipe_detail),
+    ]
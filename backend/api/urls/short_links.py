@@ -1,8 +1,14 @@
+from django.conf import settings
 from django.urls import path
 
 from ..views import ShortLinkRedirect
 
 
+if settings.ASYNC_VIEWS:
+    from ..async_views import short_link_redirect
+else:
+    short_link_redirect = ShortLinkRedirect.as_view()
+
 urlpatterns = [
-    path('s/<id>/', ShortLinkRedirect.as_view(), name='short-link-redirect')
+    path('s/<id>/', short_link_redirect, name='short-link-redirect')
 ]
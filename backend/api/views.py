@@ -1,13 +1,32 @@
-from django.db import IntegrityError
-from django.db.models import Q
-from django.db.models.functions import Lower
-from django.http import HttpResponse, HttpResponseRedirect
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import (
+    Count,
+    Exists,
+    F,
+    Max,
+    OuterRef,
+    Prefetch,
+    Value,
+    Window,
+)
+from django.db.models.functions import Lower, RowNumber
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
 from djoser.permissions import CurrentUserOrAdmin
 from djoser.views import UserViewSet as BaseUserViewSet
+from itertools import groupby
 from rest_framework import filters, mixins, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.permissions import (
+    IsAdminUser,
     IsAuthenticated,
     IsAuthenticatedOrReadOnly,
 )
@@ -15,17 +34,25 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from urllib.parse import urljoin
 
+from foodgram import changelog, db_stats, memberships
 from foodgram.models import (
     Favorite,
     Ingredient,
     Recipe,
+    RecipeIngredient,
     ShoppingCart,
-    ShortLink,
+    ShoppingListItem,
     Subscription,
     User,
 )
 
-from . import shopping_cart_generator
+from . import ingredient_catalog, shopping_cart_generator, short_codes
+from .conditional import (
+    ConditionalGetMixin,
+    get_user_state,
+    latest,
+    make_etag,
+)
 from .exceptions import (
     AlreadyFavorited,
     AlreadyInShoppingCart,
@@ -34,16 +61,22 @@ from .exceptions import (
     NotInShoppingCart,
     NotSubscribed,
     SelfSubscribe,
+    SyncTokenExpired,
 )
 from .pagination import PageLimitPagination
 from .permissions import IsAuthorOrReadOnly, IsCurrentUser
+from .replica_reads import ReplicaReadMixin
+from .response_cache import AnonymousCacheMixin
 from .serializers import (
     AvatarSerializer,
+    IdListSerializer,
     IngredientSerializer,
     PartialUpdateRecipeSerializer,
+    RecipeChangesQuerySerializer,
     RecipeMinifiedSerializer,
     RecipeSerializer,
     RecipesQuerySerializer,
+    ShoppingListItemSerializer,
     ShortLinkSerializer,
     UserSubscribeQuerySerializer,
     UserSubscriptionsQuerySerializer,
@@ -51,9 +84,41 @@ from .serializers import (
 )
 
 
-class UserViewSet(BaseUserViewSet):
+class UserViewSet(ReplicaReadMixin, ConditionalGetMixin, BaseUserViewSet):
     pagination_class = PageLimitPagination
 
+    def get_list_validators(self, request):
+        state, _ = get_user_state(request.user)
+        users = self.filter_queryset(self.get_queryset()).order_by()
+        summary = users.aggregate(
+            updated_at=Max('updated_at'),
+            count=Count('pk'),
+        )
+        return make_etag(
+            request.build_absolute_uri(),
+            summary['updated_at'],
+            summary['count'],
+            request.user.pk,
+            state,
+        ), None
+
+    def get_retrieve_validators(self, request):
+        if self.action == 'me':
+            updated_at = self.get_object().updated_at
+        else:
+            values = self.get_object_values(
+                self.get_queryset(), 'updated_at')
+            if values is None:
+                return None, None
+            updated_at, = values
+
+        state, state_modified_at = get_user_state(request.user)
+        return (
+            make_etag(request.build_absolute_uri(), updated_at,
+                      request.user.pk, state),
+            latest(updated_at, state_modified_at),
+        )
+
     def get_permissions(self):
         # В настройках PERMISSIONS Djoser нет current_user
         if self.action == 'me':
@@ -64,40 +129,89 @@ class UserViewSet(BaseUserViewSet):
             detail=True,
             permission_classes=[CurrentUserOrAdmin])
     def subscribe(self, request, id=None):
-        subscribe_to = get_object_or_404(User, pk=id)
-        if request.user == subscribe_to:
-            raise SelfSubscribe()
-
         if request.method == 'POST':
+            subscribe_to = get_object_or_404(User, pk=id)
+            if request.user == subscribe_to:
+                raise SelfSubscribe()
+
             query_params_serializer = UserSubscribeQuerySerializer(
                 data=request.query_params)
             query_params_serializer.is_valid(raise_exception=True)
             query_params = query_params_serializer.validated_data
 
-            try:
-                subscription = Subscription.objects.create(
-                    user=request.user, subscribed_to=subscribe_to)
+            if not memberships.add(
+                    Subscription, request.user, [subscribe_to.pk]):
+                raise AlreadySubscribed()
+            serializer = UserWithRecipesSerializer(
+                subscribe_to,
+                recipes_limit=query_params.get('recipes_limit', None),
+            )
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-                serializer = UserWithRecipesSerializer(
-                    subscription.subscribed_to,
-                    recipes_limit=query_params.get('recipes_limit', None),
-                )
+        # DELETE
+        if memberships.remove(Subscription, request.user, [id]):
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        if request.user == get_object_or_404(User, pk=id):
+            raise SelfSubscribe()
+        raise NotSubscribed()
 
-                return Response(serializer.data,
-                                status=status.HTTP_201_CREATED)
-            except IntegrityError:
-                raise AlreadySubscribed()
-        else:
-            subscription = request.user.subscriptions.filter(
-                subscribed_to=subscribe_to).first()
-            if subscription:
-                subscription.delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
-            raise NotSubscribed()
+    @action(['post', 'delete'],
+            detail=False,
+            url_path='subscribe',
+            permission_classes=[IsAuthenticated])
+    def subscribe_many(self, request):
+        ids = get_bulk_ids(request, User.objects.all())
+        if request.user.pk in ids:
+            raise SelfSubscribe()
+        return bulk_response(request, Subscription, ids)
+
+
+def get_bulk_ids(request, queryset) -> list[int]:
+    """id из тела запроса к пакетному действию; все должны быть в
+    queryset."""
+    serializer = IdListSerializer(
+        data=request.data, context={'queryset': queryset})
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data['ids']
+
+
+def bulk_response(request, model, ids):
+    """Добавляет (POST) или удаляет (DELETE) связи пользователя с ids.
+
+    Повторный запрос ничего не меняет, в ответе - id, которых он коснулся.
+    """
+    if request.method == 'POST':
+        return Response({'added': memberships.add(model, request.user, ids)})
+    return Response({'removed': memberships.remove(model, request.user, ids)})
+
+
+def remove_one(request, model, queryset, pk, not_found):
+    """Удаляет связь пользователя с объектом pk. Объект запрашивается,
+    только если связи не было: 404 для несуществующего, иначе not_found."""
+    if memberships.remove(model, request.user, [pk]):
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    get_object_or_404(queryset.only('pk'), pk=pk)
+    raise not_found()
+
+
+def stream_content(request, chunks):
+    """Содержимое StreamingHttpResponse. Синхронный итератор под ASGI
+    Django собирает целиком до отправки, поэтому там части берутся по
+    одной в потоке представления, где открыты курсоры .iterator()."""
+    if not isinstance(request, ASGIRequest):
+        return chunks
+
+    async def iterate():
+        get_next = sync_to_async(next, thread_sensitive=True)
+        while (chunk := await get_next(chunks, None)) is not None:
+            yield chunk
+    return iterate()
 
 
 class CurrentUserViewSet(viewsets.ViewSet):
     permission_classes = (IsAuthenticated,)
+    # Картинку можно передать файлом, без base64
+    parser_classes = (JSONParser, MultiPartParser)
 
     @action(['put', 'delete'], detail=False)
     def avatar(self, request):
@@ -114,23 +228,26 @@ class CurrentUserViewSet(viewsets.ViewSet):
 
     def delete_avatar(self, request):
         request.user.avatar = None
-        request.user.save()
+        # Только аватар, см. AvatarSerializer.update
+        request.user.save(update_fields=['avatar', 'updated_at'])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class SubscriptionViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     pagination_class = PageLimitPagination
+    cursor_ordering = ('subscribed_at', 'subscription_id')
     permission_classes = (IsCurrentUser,)
     serializer_class = UserWithRecipesSerializer
 
     def initial(self, request, *args, **kwargs):
         super().initial(request, *args, **kwargs)
+        self.parse_query_params(request)
 
+    def parse_query_params(self, request):
         query_params_serializer = UserSubscriptionsQuerySerializer(
-            data=self.request.query_params)
+            data=request.query_params)
         query_params_serializer.is_valid(raise_exception=True)
 
-        self.limit = query_params_serializer.validated_data.get('limit', None)
         self.recipes_limit = query_params_serializer.validated_data.get(
             'recipes_limit', None)
 
@@ -140,33 +257,103 @@ class SubscriptionViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
         return serializer
 
     def get_queryset(self):
-        subscriptions = self.request.user.subscriptions.select_related(
-            'subscribed_to')[:self.limit]
-        return [x.subscribed_to for x in subscriptions]
+        # limit обрабатывает пагинатор, здесь только recipes_limit: первые
+        # recipes_limit рецептов каждого автора выбираются одним запросом
+        recipes = Recipe.objects.order_by('id')
+        if self.recipes_limit is not None:
+            recipes = recipes.annotate(row_number=Window(
+                RowNumber(),
+                partition_by=F('author'),
+                order_by=F('id').asc(),
+            )).filter(row_number__lte=self.recipes_limit)
+
+        return (
+            User.objects
+            .filter(subscribers__user=self.request.user)
+            .annotate(
+                recipes_count=Count('recipes'),
+                is_subscribed=Value(True),
+                subscribed_at=F('subscribers__created_at'),
+                subscription_id=F('subscribers__id'),
+            )
+            .prefetch_related(Prefetch(
+                'recipes',
+                queryset=recipes,
+                to_attr='limited_recipes',
+            ))
+            .order_by('subscribed_at', 'subscription_id')
+        )
 
 
 class NameSearchFilter(filters.SearchFilter):
     search_param = 'name'
-    # Без этого тест get_ingredients_list_with_name_filter иногда валится, т.к.
-    # там проверка с учетом регистра
+    # Поиск по началу названия без учета регистра, как в каталоге в памяти
+    # (api.ingredient_catalog). Раньше здесь был startswith под проверку с
+    # учетом регистра в тесте get_ingredients_list_with_name_filter, тест
+    # коллекции Postman обновлен. ё и е различает только этот путь через БД
     lookup_prefixes = filters.SearchFilter.lookup_prefixes | {
-        # NOTE: SQLite не поддерживает LIKE с учетом регистра;
-        # startswith для SQLite действует как istartswith
-        '^': 'startswith',
+        '^': 'istartswith',
     }
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ReplicaReadMixin,
+                        ConditionalGetMixin,
+                        viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = [NameSearchFilter]
     search_fields = ['^name']
 
+    def get_list_validators(self, request):
+        name = request.query_params.get(NameSearchFilter.search_param)
+        return make_etag(ingredient_catalog.get_version(), name), None
+
+    def get_retrieve_validators(self, request):
+        values = self.get_object_values(self.get_queryset(), 'updated_at')
+        if values is None:
+            return None, None
+        updated_at, = values
+        return make_etag(updated_at), updated_at
+
+    def list(self, request, *args, **kwargs):
+        # Поиск по началу названия идёт по каталогу в памяти, без БД
+        name = request.query_params.get(NameSearchFilter.search_param)
+        if name is None:
+            return self.list_all(
+                request, ingredient_catalog.catalog.rendered())
+        return self.get_conditional_response(
+            request,
+            self.get_list_validators,
+            lambda: Response(self.get_serializer(
+                ingredient_catalog.catalog.search(name), many=True).data),
+        )
+
+    def list_all(self, request, rendered):
+        # Полный список отдаётся заранее отрендеренным и сжатым
+        coding = rendered.negotiate(request.headers.get('Accept-Encoding', ''))
 
-class RecipeViewSet(viewsets.ModelViewSet):
+        response = HttpResponse(
+            rendered.bodies[coding],
+            content_type='application/json',
+        )
+        response['ETag'] = rendered.get_etag(coding)
+        response['Vary'] = 'Accept-Encoding'
+        if coding:
+            response['Content-Encoding'] = coding
+        return get_conditional_response(
+            request, etag=response['ETag'], response=response)
+
+
+class RecipeViewSet(ReplicaReadMixin,
+                    ConditionalGetMixin,
+                    AnonymousCacheMixin,
+                    viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer  # см. get_serializer_class
     pagination_class = PageLimitPagination
+    cursor_ordering = ('-created_at', '-id')
+    parser_classes = (JSONParser, MultiPartParser)
+    retrieve_validator_fields = ('updated_at', 'author__updated_at')
     http_method_names = ['get', 'post', 'patch', 'delete', 'head']
 
     def partial_update(self, request, *args, **kwargs):
@@ -175,13 +362,63 @@ class RecipeViewSet(viewsets.ModelViewSet):
         # kwargs['partial'] = True
         return self.update(request, *args, **kwargs)
 
+    def get_list_validators(self, request):
+        def compute():
+            summary = self.get_queryset().order_by().aggregate(
+                **self.get_list_summary())
+            return self.make_list_validators(
+                request, summary, get_user_state(request.user))
+        return self.get_anonymous_validators(request, compute)
+
+    def get_list_summary(self) -> dict:
+        # Агрегаты, из которых строится ETag списка; их же выполняет
+        # асинхронный путь (api.async_views)
+        return {
+            'updated_at': Max('updated_at'),
+            'author_updated_at': Max('author__updated_at'),
+            'count': Count('pk'),
+        }
+
+    def make_list_validators(self, request, summary: dict,
+                             user_state: tuple):
+        state, _ = user_state
+        # Удаление рецепта не сдвигает Max(updated_at), поэтому для списка
+        # отдаётся только ETag, в который входит количество
+        return make_etag(
+            request.build_absolute_uri(),
+            summary['updated_at'],
+            summary['author_updated_at'],
+            summary['count'],
+            request.user.pk,
+            state,
+        ), None
+
+    def get_retrieve_validators(self, request):
+        def compute():
+            dates = self.get_object_values(
+                Recipe.objects.all(), *self.retrieve_validator_fields)
+            if dates is None:
+                return None, None
+            return self.make_retrieve_validators(
+                request, dates, get_user_state(request.user))
+        return self.get_anonymous_validators(request, compute)
+
+    def make_retrieve_validators(self, request, dates: tuple,
+                                 user_state: tuple):
+        state, state_modified_at = user_state
+        return (
+            make_etag(request.build_absolute_uri(), *dates,
+                      request.user.pk, state),
+            latest(*dates, state_modified_at),
+        )
+
     def get_serializer_class(self):
         if self.action == 'partial_update':
             return PartialUpdateRecipeSerializer
         return super().get_serializer_class()
 
     def get_queryset(self):
-        query = super().get_queryset()
+        query = self.annotate_queryset(super().get_queryset())
 
         #
         # NOTE: DjangoFilterBackend не работает с вычисляемыми полями, поэтому
@@ -196,24 +433,24 @@ class RecipeViewSet(viewsets.ModelViewSet):
         is_favorited = query_params.get('is_favorited', None)
         if is_favorited:
             if self.request.user.is_authenticated:
-                query = query.filter(favorited__user=self.request.user)
+                query = query.filter(is_favorited=True)
             else:
-                return []
+                return query.none()
         # is_favorited может быть None
         elif is_favorited == False:  # noqa: E712
             if self.request.user.is_authenticated:
-                query = query.filter(~Q(favorited__user=self.request.user))
+                query = query.filter(is_favorited=False)
 
         is_in_shopping_cart = query_params.get('is_in_shopping_cart', None)
         if is_in_shopping_cart:
             if self.request.user.is_authenticated:
-                query = query.filter(recipe_carts__user=self.request.user)
+                query = query.filter(is_in_shopping_cart=True)
             else:
-                return []
+                return query.none()
         # is_in_shopping_cart может быть None
         elif is_in_shopping_cart == False:  # noqa: E712
             if self.request.user.is_authenticated:
-                query = query.filter(~Q(recipe_carts__user=self.request.user))
+                query = query.filter(is_in_shopping_cart=False)
 
         author = query_params.get('author', None)
         if author is not None:
@@ -221,6 +458,31 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         return query
 
+    def annotate_queryset(self, query):
+        """Подгружает всё, что нужно RecipeSerializer, фиксированным числом
+        запросов, независимо от размера страницы."""
+        query = query.select_related('author').prefetch_related(Prefetch(
+            'ingredients',
+            queryset=RecipeIngredient.objects.select_related('ingredient'),
+        ))
+
+        user = self.request.user
+        if not user.is_authenticated:
+            return query.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+                author_is_subscribed=Value(False),
+            )
+
+        return query.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            author_is_subscribed=Exists(Subscription.objects.filter(
+                user=user, subscribed_to=OuterRef('author'))),
+        )
+
     def get_permissions(self):
         if self.action in ('update', 'partial_update', 'destroy'):
             self.permission_classes = (IsAuthorOrReadOnly,)
@@ -231,68 +493,153 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @action(['get'], detail=False)
+    def changes(self, request):
+        """Изменения рецептов, избранного, корзины и подписок после token
+        (см. foodgram.changelog). Клиент повторяет запрос с полученным
+        token, пока has_more. На токен старше очищенной части журнала -
+        410 и token, с которого продолжать после полной синхронизации."""
+        query_params_serializer = RecipeChangesQuerySerializer(
+            data=request.query_params)
+        query_params_serializer.is_valid(raise_exception=True)
+        query_params = query_params_serializer.validated_data
+
+        try:
+            page = changelog.changes_since(
+                request.user, query_params['token'], query_params['limit'])
+        except changelog.TokenExpired as e:
+            raise SyncTokenExpired(str(e.token))
+        recipes = page.changes[changelog.Kind.RECIPE]
+        # Рецепт мог быть удалён после последней записи на этой странице,
+        # тогда удаление придёт на следующей
+        updated_recipes = self.annotate_queryset(
+            Recipe.objects.filter(pk__in=recipes.updated)).order_by('pk')
+
+        def user_changes(kind):
+            changes = page.changes[kind]
+            return {'added': changes.updated, 'removed': changes.deleted}
+
+        return Response({
+            'token': str(page.token),
+            'has_more': page.has_more,
+            'recipes': {
+                'updated': self.get_serializer(
+                    updated_recipes, many=True).data,
+                'deleted': recipes.deleted,
+            },
+            'favorites': user_changes(changelog.Kind.FAVORITE),
+            'shopping_cart': user_changes(changelog.Kind.SHOPPING_CART),
+            'subscriptions': user_changes(changelog.Kind.SUBSCRIPTION),
+        })
+
     @action(['post', 'delete'],
             detail=True,
             permission_classes=[IsAuthenticated])
     def favorite(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
-
         if request.method == 'POST':
-            try:
-                favorite = Favorite.objects.create(user=request.user,
-                                                   recipe=recipe)
-                return Response(RecipeMinifiedSerializer(favorite.recipe).data,
-                                status=status.HTTP_201_CREATED)
-            except IntegrityError:
+            recipe = get_object_or_404(Recipe, pk=pk)
+            if not memberships.add(Favorite, request.user, [recipe.pk]):
                 raise AlreadyFavorited()
+            return Response(RecipeMinifiedSerializer(recipe).data,
+                            status=status.HTTP_201_CREATED)
 
         # DELETE
-        favorite = request.user.favorites.filter(recipe=recipe).first()
-        if favorite:
-            favorite.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        raise NotFavorited()
+        return remove_one(
+            request, Favorite, Recipe.objects.all(), pk, NotFavorited)
+
+    @action(['post', 'delete'],
+            detail=False,
+            url_path='favorite',
+            permission_classes=[IsAuthenticated])
+    def favorite_many(self, request):
+        ids = get_bulk_ids(request, Recipe.objects.all())
+        return bulk_response(request, Favorite, ids)
 
     @action(['post', 'delete'],
             detail=True,
             permission_classes=[IsAuthenticated])
     def shopping_cart(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
-
         if request.method == 'POST':
-            try:
-                cart = ShoppingCart.objects.create(user=request.user,
-                                                   recipe=recipe)
-                return Response(RecipeMinifiedSerializer(cart.recipe).data,
-                                status=status.HTTP_201_CREATED)
-            except IntegrityError:
+            recipe = get_object_or_404(Recipe, pk=pk)
+            if not memberships.add(ShoppingCart, request.user, [recipe.pk]):
                 raise AlreadyInShoppingCart()
+            return Response(RecipeMinifiedSerializer(recipe).data,
+                            status=status.HTTP_201_CREATED)
 
         # DELETE
-        cart = request.user.user_carts.filter(recipe=recipe).first()
-        if cart:
-            cart.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        raise NotInShoppingCart()
+        return remove_one(
+            request, ShoppingCart, Recipe.objects.all(), pk, NotInShoppingCart)
+
+    @action(['post', 'delete'],
+            detail=False,
+            url_path='shopping_cart',
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_many(self, request):
+        ids = get_bulk_ids(request, Recipe.objects.all())
+        return bulk_response(request, ShoppingCart, ids)
+
+    def get_shopping_list(self, request):
+        return (
+            ShoppingListItem.objects
+            .filter(user=request.user)
+            .select_related('ingredient')
+            .order_by(Lower('ingredient__name'))
+        )
+
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def shopping_cart_summary(self, request):
+        serializer = ShoppingListItemSerializer(
+            self.get_shopping_list(request), many=True)
+        return Response(serializer.data)
 
     @action(detail=False, permission_classes=[IsAuthenticated])
     def download_shopping_cart(self, request):
-        cart = (
-            request.user.user_carts.filter()
-            .select_related('recipe')
-            .prefetch_related('recipe__ingredients__ingredient')
-            # Не работает как хотелось бы
-            # .prefetch_related(Prefetch(
-            #     'recipe__ingredients__ingredient',
-            #     queryset=Ingredient.objects.order_by(Lower('name')),
-            # ))
-            .order_by(Lower('recipe__name'))
+        # Итоги по ингредиентам поддерживаются в ShoppingListItem
+        ingredients = (
+            shopping_cart_generator.RecipeIngredient(
+                x.ingredient.name,
+                x.ingredient.measurement_unit,
+                x.total_amount,
+            )
+            for x in self.get_shopping_list(request).iterator()
         )
 
-        recipes = [shopping_cart_generator.Recipe(x.recipe) for x in cart]
-        gen = shopping_cart_generator.ShoppingCartGenerator(recipes)
-        return HttpResponse(
-            str(gen),
+        recipe_names = (
+            Recipe.objects
+            .filter(recipe_carts__user=request.user)
+            .filter(Exists(
+                RecipeIngredient.objects.filter(recipe=OuterRef('pk'))))
+            .order_by(Lower('name'), 'pk')
+            .values_list('name', flat=True)
+            .iterator()
+        )
+
+        rows = (
+            RecipeIngredient.objects
+            .filter(recipe__recipe_carts__user=request.user)
+            .order_by(Lower('recipe__name'), 'recipe',
+                      Lower('ingredient__name'))
+            .values_list(
+                'recipe',
+                'recipe__name',
+                'ingredient__name',
+                'ingredient__measurement_unit',
+                'amount',
+            )
+            .iterator()
+        )
+        recipes = (
+            shopping_cart_generator.Recipe(name, [
+                shopping_cart_generator.RecipeIngredient(*x[2:])
+                for x in group
+            ])
+            for (_, name), group in groupby(rows, key=lambda x: x[:2])
+        )
+
+        gen = shopping_cart_generator.ShoppingCartGenerator(
+            ingredients, recipe_names, recipes)
+        return StreamingHttpResponse(
+            stream_content(request._request, gen.chunks()),
             content_type='text/plain',
             headers={
                 'Content-Disposition': 'attachment;'
@@ -302,16 +649,27 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, url_path='get-link')
     def get_link(self, request, pk=None):
-        get_object_or_404(Recipe, pk=pk)
-        short_link = ShortLink.objects.update_or_create(
-            destination=f'/recipes/{pk}')
+        # Код вычисляется из id, записывать в БД ничего не нужно
+        recipe = get_object_or_404(Recipe.objects.only('pk'), pk=pk)
         context = self.get_serializer_context()
-        return Response(ShortLinkSerializer(short_link, context=context).data)
+        return Response(ShortLinkSerializer(
+            short_codes.encode(recipe.pk), context=context).data)
 
 
 class ShortLinkRedirect(APIView):
     def get(self, request, id=None):
-        short_link = get_object_or_404(ShortLink, pk=id)
+        destination = short_codes.resolve(id)
+        if destination is None:
+            raise Http404
+        short_codes.hit_counter.add(id)
         base_uri = request.build_absolute_uri('/')
-        destination = urljoin(base_uri, short_link.destination)
+        destination = urljoin(base_uri, destination)
         return HttpResponseRedirect(redirect_to=destination)
+
+
+class DatabaseStatusView(APIView):
+    """Соединения с БД и статистика пула текущего воркера."""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(db_stats.get_stats())
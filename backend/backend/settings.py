@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 from dotenv import load_dotenv
+import copy
 import os
 
 load_dotenv()
@@ -56,6 +57,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.instrumentation.performance_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,6 +65,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'foodgram.db_routing.sticky_writes_middleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -107,6 +110,69 @@ else:
         }
     }
 
+    # Соединения с PostgreSQL: пул psycopg (DB_POOL=1), постоянные
+    # соединения (DB_CONN_MAX_AGE) или новое соединение на каждый запрос.
+    # Пул и CONN_MAX_AGE вместе Django не поддерживает
+    if os.getenv('DB_POOL', '0') == '1':
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+                # Сколько секунд ждать свободного соединения
+                'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+            },
+        }
+    else:
+        # none - не закрывать соединения по времени
+        conn_max_age = os.getenv('DB_CONN_MAX_AGE', '0')
+        DATABASES['default']['CONN_MAX_AGE'] = (
+            None if conn_max_age == 'none' else int(conn_max_age))
+        DATABASES['default']['CONN_HEALTH_CHECKS'] = (
+            os.getenv('DB_CONN_HEALTH_CHECKS', '1') == '1')
+
+# Реплики только для чтения: через запятую хосты PostgreSQL (host или
+# host:port) или, в режиме DEBUG, пути к файлам SQLite
+# (см. foodgram.db_routing)
+DATABASE_REPLICAS = []
+for i, replica in enumerate(filter(None, map(
+        str.strip, os.getenv('DB_REPLICAS', '').split(','))), 1):
+    replica_settings = copy.deepcopy(DATABASES['default'])
+    if DEBUG:
+        replica_settings['NAME'] = replica
+    else:
+        host, _, port = replica.partition(':')
+        replica_settings['HOST'] = host
+        replica_settings['PORT'] = port or replica_settings['PORT']
+    replica_settings['TEST'] = {'MIRROR': 'default'}
+    DATABASES[f'replica{i}'] = replica_settings
+    DATABASE_REPLICAS.append(f'replica{i}')
+
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['foodgram.db_routing.ReplicaRouter']
+
+# Сколько секунд после изменяющего запроса читать данные пользователя
+# из основной БД, а не с реплики
+DB_REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', 5))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# Кэш в файлах общий для всех воркеров gunicorn, локальный кэш в памяти - нет
+if os.getenv('CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_DIR'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -145,6 +211,17 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'build/static')
 
+# Картинки хранятся под именами по хэшу содержимого, одинаковые файлы
+# не дублируются (foodgram.storage)
+STORAGES = {
+    'default': {
+        'BACKEND': 'foodgram.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -155,10 +232,83 @@ AUTH_USER_MODEL = "foodgram.User"
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ),
 }
 
+# Сколько секунд кэшировать пользователя по токену в общем кэше и в памяти
+# воркера (api.authentication). Во втором случае выход и блокировка
+# пользователя в других воркерах вступают в силу с этой задержкой
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 300))
+AUTH_TOKEN_LOCAL_CACHE_TIMEOUT = int(
+    os.getenv('AUTH_TOKEN_LOCAL_CACHE_TIMEOUT', 5))
+
+# Сколько секунд хранить количество объектов для пагинации и с какого
+# размера выборки на PostgreSQL довольствоваться оценкой планировщика
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', 30))
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = int(
+    os.getenv('PAGINATION_COUNT_ESTIMATE_THRESHOLD', 10_000))
+
+# Сколько секунд хранить ответы списка и страницы рецепта для анонимов
+ANONYMOUS_CACHE_TIMEOUT = int(os.getenv('ANONYMOUS_CACHE_TIMEOUT', 60))
+
+# Наибольший размер загружаемой картинки в байтах. Файлы больше
+# FILE_UPLOAD_MAX_MEMORY_SIZE (2,5 МБ) принимаются во временные файлы
+MAX_IMAGE_UPLOAD_SIZE = int(
+    os.getenv('MAX_IMAGE_UPLOAD_SIZE', 10 * 1024 * 1024))
+
+# Сколько потоков строят уменьшенные копии картинок; 0 - строить сразу
+# после коммита в потоке запроса
+IMAGE_PROCESSING_WORKERS = int(os.getenv('IMAGE_PROCESSING_WORKERS', 2))
+
+# Сколько секунд кэшировать старые короткие ссылки из таблицы ShortLink и
+# как часто записывать в БД накопленные переходы по коротким ссылкам
+SHORT_LINK_CACHE_TIMEOUT = int(os.getenv('SHORT_LINK_CACHE_TIMEOUT', 86400))
+SHORT_LINK_HITS_FLUSH_INTERVAL = int(
+    os.getenv('SHORT_LINK_HITS_FLUSH_INTERVAL', 10))
+
+# Сколько дней хранить журнал изменений (команда prune_changelog). Клиент
+# с токеном старше получит 410 и синхронизируется заново
+CHANGELOG_RETENTION_DAYS = int(os.getenv('CHANGELOG_RETENTION_DAYS', 30))
+
+# Частые GET-запросы (рецепты, ингредиенты, подписки, короткие ссылки)
+# обслуживают асинхронные представления api.async_views. Имеет смысл только
+# под ASGI-сервером (профиль asgi в gunicorn.conf.py)
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', '0') == '1'
+
+# Замеры запросов (api.instrumentation): доля запросов с подсчётом SQL и
+# времени сериализации, заголовок Server-Timing и пороги, после которых
+# запрос попадает в лог api.performance: время ответа в мс, число
+# SQL-запросов, число повторов одного и того же запроса
+PERF_INSTRUMENTATION = os.getenv('PERF_INSTRUMENTATION', '1') == '1'
+PERF_SAMPLE_RATE = float(os.getenv('PERF_SAMPLE_RATE', 0.1))
+PERF_SERVER_TIMING = os.getenv('PERF_SERVER_TIMING', '1') == '1'
+PERF_SLOW_REQUEST_MS = int(os.getenv('PERF_SLOW_REQUEST_MS', 500))
+PERF_SLOW_QUERY_COUNT = int(os.getenv('PERF_SLOW_QUERY_COUNT', 30))
+PERF_SLOW_DUPLICATE_QUERIES = int(
+    os.getenv('PERF_SLOW_DUPLICATE_QUERIES', 5))
+
+# Метрики Prometheus по адресу /metrics (api.metrics). Время ответа и число
+# SQL-запросов записывает performance_middleware, поэтому нужно и
+# PERF_INSTRUMENTATION
+METRICS = os.getenv('METRICS', '1') == '1'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.performance': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
 DJOSER = {
     'SERIALIZERS': {
         'current_user': 'api.serializers.UserSerializer',
@@ -9,6 +9,7 @@ from .models import (
     Recipe,
     RecipeIngredient,
     ShoppingCart,
+    ShoppingListItem,
     Subscription,
     User,
 )
@@ -81,10 +82,23 @@ class ShoppingCartAdmin(BaseModelAdmin):
     search_fields = ('user__email', 'recipe__name')
 
 
+class ShoppingListItemAdmin(BaseModelAdmin):
+    list_display = (
+        'pk',
+        'user',
+        'ingredient',
+        'total_amount',
+        'recipe_count',
+        'created_at',
+    )
+    search_fields = ('user__email', 'ingredient__name')
+
+
 admin.site.register(Favorite, FavoriteAdmin)
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(RecipeIngredient, RecipeIngredientAdmin)
 admin.site.register(ShoppingCart, ShoppingCartAdmin)
+admin.site.register(ShoppingListItem, ShoppingListItemAdmin)
 admin.site.register(Subscription, SubscriptionAdmin)
 admin.site.register(User, UserAdmin)
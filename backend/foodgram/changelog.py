@@ -0,0 +1,227 @@
+"""Журнал изменений (ChangeLogEntry) для синхронизации «изменения с токена».
+
+Записи добавляются сигналами моделей (api.signals) и явно там, где
+изменения идут в обход сигналов (update, bulk_create).
+
+На PostgreSQL id выдаются до коммита, и запись долгой транзакции может
+стать видна позже записи с большим id. Поэтому журнал читается в порядке
+(txid, id), где txid - номер транзакции, добавившей запись, и только до
+pg_snapshot_xmin: транзакции с меньшими номерами уже завершены, а все
+незавершённые и будущие получат номер не меньше. Токен синхронизации -
+пара (txid, id) последней полученной записи, так что записи, которые
+станут видны позже, придут после него. Долгая транзакция задерживает
+выдачу новых записей до своего завершения, но ничего не теряется.
+
+На SQLite транзакции пишут по очереди, и txid всегда 0.
+
+Старые записи удаляет команда prune_changelog (prune) и запоминает
+границу удаления (ChangeLogHorizon). Токен раньше границы больше не
+продолжить: changes_since бросает TokenExpired, и клиент синхронизируется
+заново.
+"""
+from dataclasses import dataclass, field
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from typing import Iterable
+
+from .models import ChangeLogEntry, ChangeLogHorizon, User, UserChangeState
+
+
+Kind = ChangeLogEntry.Kind
+
+
+def record(kind: Kind, object_id: int, user_id: int | None = None,
+           deleted: bool = False):
+    ChangeLogEntry.objects.create(
+        kind=kind, object_id=object_id, user_id=user_id, deleted=deleted)
+    if user_id is not None:
+        touch_user(user_id)
+
+
+def record_many(kind: Kind, object_ids: Iterable[int],
+                user_id: int | None = None, deleted: bool = False):
+    entries = ChangeLogEntry.objects.bulk_create(
+        ChangeLogEntry(
+            kind=kind, object_id=x, user_id=user_id, deleted=deleted)
+        for x in object_ids
+    )
+    if entries and user_id is not None:
+        touch_user(user_id)
+
+
+def touch_user(user_id: int):
+    """Сдвигает версию состояния пользователя (UserChangeState) в
+    транзакции, которая пишет журнал. UPDATE блокирует строку, так что
+    одновременные записи не получат одну версию."""
+    values = {
+        'version': F('version') + 1,
+        'modified_at': timezone.now(),
+    }
+    state = UserChangeState.objects.filter(user_id=user_id)
+    if not state.update(**values):
+        UserChangeState.objects.bulk_create(
+            [UserChangeState(user_id=user_id)], ignore_conflicts=True)
+        state.update(**values)
+
+
+@dataclass
+class Changes:
+    """Изменения одного вида: id изменённых (добавленных) и удалённых
+    объектов в порядке последнего изменения."""
+
+    updated: list[int] = field(default_factory=list)
+    deleted: list[int] = field(default_factory=list)
+
+
+# Записи до этой транзакции не появятся: все транзакции до неё завершены
+SETTLED_TXID_SQL = 'pg_snapshot_xmin(pg_current_snapshot())::text::bigint'
+
+
+@dataclass(frozen=True, order=True)
+class Token:
+    txid: int = 0
+    id: int = 0
+
+    def __str__(self):
+        return f'{self.txid}.{self.id}'
+
+    @classmethod
+    def parse(cls, value: str) -> 'Token':
+        """txid.id или просто id (токены до появления txid). ValueError,
+        если строка не токен."""
+        parts = [int(x) for x in value.split('.')]
+        if len(parts) > 2 or any(x < 0 for x in parts):
+            raise ValueError(value)
+        return cls(*parts) if len(parts) == 2 else cls(id=parts[0])
+
+
+class TokenExpired(Exception):
+    """Записи после токена частично удалены очисткой журнала. token -
+    откуда продолжать после полной синхронизации."""
+
+    def __init__(self, token: Token):
+        super().__init__(str(token))
+        self.token = token
+
+
+@dataclass
+class ChangesPage:
+    token: Token
+    has_more: bool
+    changes: dict[Kind, Changes]
+
+
+def changes_since(user: User, token: Token, limit: int) -> ChangesPage:
+    """Не больше limit записей журнала после token, видимых пользователю.
+
+    Несколько записей об одном объекте схлопываются в последнюю.
+    TokenExpired, если token раньше границы очистки журнала.
+    """
+    visible = Q(user=None)
+    if user.is_authenticated:
+        visible |= Q(user=user)
+
+    entries = settled(
+        ChangeLogEntry.objects
+        .filter(visible)
+        .filter(Q(txid__gt=token.txid) | Q(txid=token.txid, id__gt=token.id))
+    )
+    entries = list(
+        entries
+        .order_by('txid', 'id')
+        .values_list('txid', 'id', 'kind', 'object_id', 'deleted')
+        [:limit + 1]
+    )
+    # Границу читаем после записей: если очистка прошла между запросами,
+    # её граница уже видна
+    horizon = get_horizon()
+    if horizon is not None and token < horizon:
+        raise TokenExpired(get_head(horizon))
+
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    latest = {}
+    for _, _, kind, object_id, deleted in entries:
+        # Повторная вставка переносит ключ в конец
+        latest.pop((kind, object_id), None)
+        latest[kind, object_id] = deleted
+
+    changes = {x: Changes() for x in Kind}
+    for (kind, object_id), deleted in latest.items():
+        target = changes[kind]
+        (target.deleted if deleted else target.updated).append(object_id)
+
+    return ChangesPage(
+        token=Token(*entries[-1][:2]) if entries else token,
+        has_more=has_more,
+        changes=changes,
+    )
+
+
+def settled(entries):
+    """Только записи, до которых уже не появятся новые (см. описание
+    модуля)."""
+    if connections[entries.db].vendor == 'postgresql':
+        entries = entries.filter(txid__lt=RawSQL(SETTLED_TXID_SQL, []))
+    return entries
+
+
+def get_horizon() -> Token | None:
+    row = (
+        ChangeLogHorizon.objects
+        .order_by('-txid', '-last_id')
+        .values_list('txid', 'last_id')
+        .first()
+    )
+    return Token(*row) if row else None
+
+
+def get_head(horizon: Token | None = None) -> Token:
+    """Токен последней записи журнала. Если взять его до полной
+    синхронизации, изменения после неё придут по этому токену."""
+    row = (
+        settled(ChangeLogEntry.objects)
+        .order_by('-txid', '-id')
+        .values_list('txid', 'id')
+        .first()
+    )
+    if row:
+        return Token(*row)
+    return horizon or Token()
+
+
+def prune(before, batch_size: int, dry_run: bool = False) -> int:
+    """Удаляет записи журнала, добавленные до before, по batch_size за
+    запрос, и сдвигает границу очистки. Возвращает число удалённых."""
+    row = (
+        settled(ChangeLogEntry.objects.filter(created_at__lt=before))
+        .order_by('-txid', '-id')
+        .values_list('txid', 'id')
+        .first()
+    )
+    horizon = get_horizon()
+    if row and (horizon is None or Token(*row) > horizon):
+        horizon = Token(*row)
+        if not dry_run:
+            # Граница записывается до удаления: читатель, который не нашёл
+            # удалённые записи, уже увидит её (changes_since)
+            ChangeLogHorizon.objects.create(
+                txid=horizon.txid, last_id=horizon.id)
+            ChangeLogHorizon.objects.filter(
+                Q(txid__lt=horizon.txid)
+                | Q(txid=horizon.txid, last_id__lt=horizon.id)
+            ).delete()
+    if horizon is None:
+        return 0
+
+    entries = ChangeLogEntry.objects.filter(
+        Q(txid__lt=horizon.txid) | Q(txid=horizon.txid, id__lte=horizon.id))
+    if dry_run:
+        return entries.count()
+    deleted = 0
+    while ids := list(entries.values_list('pk', flat=True)[:batch_size]):
+        deleted += ChangeLogEntry.objects.filter(pk__in=ids).delete()[0]
+    return deleted
@@ -1,4 +1,5 @@
 MAX_AMOUNT_VALUE = 32_000
+MAX_BULK_IDS = 100
 MAX_COOKING_TIME_VALUE = 32_000
 MIN_AMOUNT_VALUE = 1
 MIN_COOKING_TIME_VALUE = 1
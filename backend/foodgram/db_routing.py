@@ -0,0 +1,107 @@
+"""Чтение с реплик БД (DB_REPLICAS) с учётом собственных записей.
+
+Запросы идут в основную БД, пока представление явно не разрешит чтение
+с реплики (api.replica_reads.ReplicaReadMixin). Реплика выбирается одна на
+весь запрос, чтобы его запросы не видели реплики с разным отставанием.
+
+После успешного изменяющего запроса пользователя (POST, PATCH, DELETE...)
+его чтения DB_REPLICA_STICKY_SECONDS секунд идут в основную БД, чтобы
+только что добавленное избранное или рецепт не пропали из ответов из-за
+отставания реплики. Метка хранится в кэше Django, поэтому для нескольких
+воркеров нужен общий кэш (CACHE_DIR).
+"""
+from asgiref.sync import iscoroutinefunction
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.decorators import sync_and_async_middleware
+import random
+
+
+# Алиас реплики для текущего запроса или None - основная БД
+_replica = ContextVar('replica', default=None)
+
+
+def sticky_key(user_id: int) -> str:
+    return f'db-routing:sticky:{user_id}'
+
+
+@contextmanager
+def read_scope():
+    """Граница запроса: внутри чтение идёт с основной БД, пока его не
+    переключит allow_replica_reads."""
+    token = _replica.set(None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def allow_replica_reads(user):
+    if settings.DATABASE_REPLICAS and not (
+            user.is_authenticated and cache.get(sticky_key(user.pk))):
+        _replica.set(random.choice(settings.DATABASE_REPLICAS))
+
+
+async def aallow_replica_reads(user):
+    if settings.DATABASE_REPLICAS and not (
+            user.is_authenticated and await cache.aget(sticky_key(user.pk))):
+        _replica.set(random.choice(settings.DATABASE_REPLICAS))
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = _replica.get()
+        if replica is None:
+            return None
+        # Внутри транзакции читаем то, что в ней же записали
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же данные, что и в основной БД
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схему реплики получают репликацией
+        return db == DEFAULT_DB_ALIAS
+
+
+def is_write(request, response) -> bool:
+    user = getattr(request, 'user', None)
+    return (
+        request.method not in ('GET', 'HEAD', 'OPTIONS')
+        and response.status_code < 400
+        and user is not None
+        and user.is_authenticated
+    )
+
+
+@sync_and_async_middleware
+def sticky_writes_middleware(get_response):
+    """Отмечает пользователя после его изменяющего запроса. request.user
+    к этому моменту выставляет аутентификация DRF."""
+    if not settings.DATABASE_REPLICAS:
+        raise MiddlewareNotUsed
+    timeout = settings.DB_REPLICA_STICKY_SECONDS
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            response = await get_response(request)
+            if is_write(request, response):
+                await cache.aset(sticky_key(request.user.pk), 1, timeout)
+            return response
+    else:
+        def middleware(request):
+            response = get_response(request)
+            if is_write(request, response):
+                cache.set(sticky_key(request.user.pk), 1, timeout)
+            return response
+    return middleware
@@ -0,0 +1,34 @@
+"""Состояние соединений с БД для мониторинга.
+
+Пул psycopg и постоянные соединения живут в каждом процессе (воркере
+gunicorn) свои, поэтому и статистика относится к текущему процессу.
+"""
+from django.db import connections
+import os
+
+
+def get_mode(connection) -> str:
+    if connection.settings_dict['OPTIONS'].get('pool'):
+        return 'pool'
+    if connection.settings_dict['CONN_MAX_AGE'] != 0:
+        return 'persistent'
+    return 'per-request'
+
+
+def get_stats() -> dict:
+    """Настройки соединений и счётчики пула по каждой БД из DATABASES."""
+    result = {}
+    for alias in connections:
+        connection = connections[alias]
+        stats = {
+            'vendor': connection.vendor,
+            'mode': get_mode(connection),
+            'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+            'health_checks': connection.settings_dict['CONN_HEALTH_CHECKS'],
+        }
+        if stats['mode'] == 'pool':
+            # pool_size, pool_available, requests_waiting, requests_num,
+            # requests_wait_ms, connections_num и т.д. (psycopg_pool)
+            stats['pool'] = connection.pool.get_stats()
+        result[alias] = stats
+    return {'pid': os.getpid(), 'databases': result}
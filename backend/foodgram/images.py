@@ -0,0 +1,140 @@
+"""Уменьшенные копии (renditions) картинок рецептов и аватаров.
+
+Копии строятся в пуле потоков после коммита транзакции, которая сохранила
+картинку, и записываются в поле ``<поле>_renditions`` модели:
+``{'source': оригинал, 'files': {имя копии: путь}}``. Пока копий нет или
+они построены для другого оригинала, сериализаторы отдают оригинал.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import Model
+from django.dispatch import Signal
+from django.utils import timezone
+from io import BytesIO
+from PIL import Image, ImageOps
+import logging
+import os
+import threading
+
+from .models import Recipe, User
+
+
+logger = logging.getLogger(__name__)
+
+# Имя копии -> (наибольшая сторона в пикселях, формат)
+RENDITIONS = {
+    'thumbnail': (320, 'WEBP'),
+    'card': (800, 'WEBP'),
+}
+
+# Модель -> поле с картинкой
+IMAGE_FIELDS = {
+    Recipe: 'image',
+    User: 'avatar',
+}
+
+# Отправляется после записи копий: sender - модель, pk - id объекта
+renditions_ready = Signal()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def renditions_field(field_name: str) -> str:
+    return f'{field_name}_renditions'
+
+
+def get_rendition(file, rendition: str) -> str | None:
+    """Путь к копии rendition для файла из поля модели, если она готова."""
+    renditions = getattr(
+        file.instance, renditions_field(file.field.name), None) or {}
+    if renditions.get('source') != file.name:
+        return None
+    return renditions.get('files', {}).get(rendition)
+
+
+def schedule(instance: Model, field_name: str):
+    """Ставит построение копий в очередь после коммита, если картинка
+    изменилась с последнего построения."""
+    file = getattr(instance, field_name)
+    renditions = getattr(instance, renditions_field(field_name))
+    name = file.name if file else None
+    if renditions.get('source') == name:
+        return
+    if not name:
+        # Картинку удалили
+        type(instance).objects.filter(pk=instance.pk).update(
+            **{renditions_field(field_name): {}})
+        setattr(instance, renditions_field(field_name), {})
+        return
+
+    args = (type(instance), instance.pk, field_name, name)
+    transaction.on_commit(lambda: submit(*args))
+
+
+def submit(model: type[Model], pk: int, field_name: str, name: str):
+    if not settings.IMAGE_PROCESSING_WORKERS:
+        process(model, pk, field_name, name)
+        return
+    get_executor().submit(_process_in_thread, model, pk, field_name, name)
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_PROCESSING_WORKERS,
+                thread_name_prefix='renditions',
+            )
+        return _executor
+
+
+def _process_in_thread(*args):
+    try:
+        process(*args)
+    except Exception:
+        logger.exception('Failed to build renditions for %r', args)
+    finally:
+        # Соединения потоков пула сами не закрываются
+        connections.close_all()
+
+
+def process(model: type[Model], pk: int, field_name: str, name: str):
+    """Строит копии картинки name и записывает их объекту, если у него всё
+    ещё та же картинка."""
+    renditions = {'source': name, 'files': render(name)}
+    updated = model.objects.filter(pk=pk, **{field_name: name}).update(**{
+        renditions_field(field_name): renditions,
+        'updated_at': timezone.now(),
+    })
+    if updated:
+        renditions_ready.send(sender=model, pk=pk)
+
+
+def render(name: str) -> dict[str, str]:
+    with default_storage.open(name) as f:
+        image = Image.open(f)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        transparent = ('A' in image.getbands()
+                       or 'transparency' in image.info)
+        image = image.convert('RGBA' if transparent else 'RGB')
+
+    stem = os.path.splitext(os.path.basename(name))[0]
+
+    files = {}
+    for rendition, (size, format) in RENDITIONS.items():
+        copy = image.copy()
+        copy.thumbnail((size, size), Image.Resampling.LANCZOS)
+        buffer = BytesIO()
+        copy.save(buffer, format, quality=80)
+        path = os.path.join(
+            'renditions', f'{stem}.{rendition}.{format.lower()}')
+        files[rendition] = default_storage.save(
+            path, ContentFile(buffer.getvalue()))
+    return files
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from foodgram import images
+
+
+class Command(BaseCommand):
+    help = ('Build missing or outdated renditions of recipe images and '
+            'avatars, e.g. after the worker that was processing them '
+            'restarted.')
+
+    def handle(self, *args, **options):
+        built = 0
+        for model, field_name in images.IMAGE_FIELDS.items():
+            objects = model.objects.exclude(**{field_name: ''}).exclude(
+                **{f'{field_name}__isnull': True})
+            for pk, name, renditions in objects.values_list(
+                    'pk', field_name, images.renditions_field(field_name)
+            ).iterator():
+                if (renditions or {}).get('source') == name:
+                    continue
+                images.process(model, pk, field_name, name)
+                built += 1
+        self.stdout.write(self.style.SUCCESS(f'{built} images processed.'))
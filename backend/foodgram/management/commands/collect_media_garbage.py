@@ -0,0 +1,85 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+import os
+import time
+
+from foodgram import images
+
+
+class Command(BaseCommand):
+    help = ('Delete files under MEDIA_ROOT that are not referenced by any '
+            'recipe image, avatar or their renditions.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=3600,
+            help='Keep files modified less than this many seconds ago: '
+                 'they may belong to uploads that are not committed yet.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='How many rows to read and files to delete at a time.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only list the files that would be deleted.',
+        )
+
+    def handle(self, *args, min_age, batch_size, dry_run, **options):
+        # Время берём до чтения ссылок: всё, что загружено позже, моложе
+        deadline = time.time() - min_age
+        referenced = self.get_referenced(batch_size)
+
+        root = default_storage.location
+        batch = []
+        deleted = freed = 0
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                if name in referenced:
+                    continue
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if stat.st_mtime > deadline:
+                    continue
+                batch.append(path)
+                freed += stat.st_size
+                if len(batch) >= batch_size:
+                    deleted += self.delete(batch, dry_run)
+                    batch = []
+        deleted += self.delete(batch, dry_run)
+
+        verb = 'Would delete' if dry_run else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {deleted} files, {freed} bytes.'))
+
+    def get_referenced(self, batch_size) -> set[str]:
+        referenced = set()
+        for model, field_name in images.IMAGE_FIELDS.items():
+            rows = model.objects.values_list(
+                field_name, images.renditions_field(field_name))
+            for name, renditions in rows.iterator(chunk_size=batch_size):
+                if name:
+                    referenced.add(name)
+                referenced.update((renditions or {}).get('files', {})
+                                  .values())
+        return referenced
+
+    def delete(self, paths, dry_run) -> int:
+        for path in paths:
+            if dry_run:
+                self.stdout.write(path)
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        return len(paths)
@@ -0,0 +1,40 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from foodgram import changelog
+
+
+class Command(BaseCommand):
+    help = ('Delete change log entries older than the retention period. '
+            'Clients with older sync tokens are told to resync fully.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.CHANGELOG_RETENTION_DAYS,
+            help='Keep entries added less than this many days ago '
+                 '(CHANGELOG_RETENTION_DAYS by default).',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='How many entries to delete at a time.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count the entries that would be deleted.',
+        )
+
+    def handle(self, *args, days, batch_size, dry_run, **options):
+        before = timezone.now() - timedelta(days=days)
+        deleted = changelog.prune(before, batch_size, dry_run)
+
+        verb = 'Would delete' if dry_run else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {deleted} change log entries, horizon is '
+            f'{changelog.get_horizon() or "not set"}.'))
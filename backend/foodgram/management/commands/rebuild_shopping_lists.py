@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from foodgram import shopping_lists
+from foodgram.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify per-user shopping list totals from carts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only compare the table with the carts, do not modify it.',
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Limit to the given user id. May be repeated.',
+        )
+
+    def handle(self, *args, verify=False, user_ids=None, **options):
+        if not verify:
+            shopping_lists.rebuild(user_ids)
+            self.stdout.write(self.style.SUCCESS('Shopping lists rebuilt.'))
+            return
+
+        expected = shopping_lists.compute(user_ids)
+
+        items = ShoppingListItem.objects.all()
+        if user_ids is not None:
+            items = items.filter(user__in=user_ids)
+        actual = {
+            (u, i): [total, count]
+            for u, i, total, count in items.values_list(
+                'user', 'ingredient', 'total_amount', 'recipe_count')
+        }
+
+        mismatches = 0
+        for key in sorted(expected.keys() | actual.keys()):
+            if expected.get(key) != actual.get(key):
+                mismatches += 1
+                self.stdout.write(
+                    f'user={key[0]} ingredient={key[1]}: '
+                    f'expected {expected.get(key)}, found {actual.get(key)}'
+                )
+
+        if mismatches:
+            raise CommandError(f'{mismatches} shopping list rows differ.')
+        self.stdout.write(self.style.SUCCESS('Shopping lists are up to date.'))
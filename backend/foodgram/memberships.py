@@ -0,0 +1,99 @@
+"""Избранное, корзина и подписки: добавление и удаление пачками.
+
+Связи пишутся одним INSERT ... ON CONFLICT DO NOTHING и удаляются одним
+DELETE по id, без сигналов моделей. Поэтому функции сами записывают журнал
+изменений (одним INSERT), обновляют списки покупок и отправляют сигнал
+changed, по которому сбрасываются кэши (api.signals).
+
+Изменения связей одного пользователя выполняются по очереди (блокировка
+строки пользователя), иначе два одновременных запроса могли бы оба
+посчитать одну и ту же связь новой или удалённой.
+"""
+from django.db import transaction
+from django.dispatch import Signal
+from typing import Iterable
+
+from . import changelog, shopping_lists
+from .models import Favorite, ShoppingCart, Subscription, User
+
+
+# Модель -> поле с id объекта, на который ссылается связь
+TARGET_FIELDS = {
+    Favorite: 'recipe_id',
+    ShoppingCart: 'recipe_id',
+    Subscription: 'subscribed_to_id',
+}
+
+KINDS = {
+    Favorite: changelog.Kind.FAVORITE,
+    ShoppingCart: changelog.Kind.SHOPPING_CART,
+    Subscription: changelog.Kind.SUBSCRIPTION,
+}
+
+# Отправляется после изменения: sender - модель, user_id - владелец связей
+changed = Signal()
+
+
+@transaction.atomic
+def add(model, user: User, object_ids: Iterable[int]) -> list[int]:
+    """Добавляет связи пользователя с object_ids, которых ещё нет.
+
+    Возвращает id объектов, связи с которыми добавлены.
+    """
+    field = TARGET_FIELDS[model]
+    object_ids = list(dict.fromkeys(object_ids))
+    _lock(user)
+
+    existing = set(model.objects.filter(
+        user=user, **{f'{field}__in': object_ids},
+    ).values_list(field, flat=True))
+    added = [x for x in object_ids if x not in existing]
+    if not added:
+        return []
+
+    model.objects.bulk_create(
+        [model(user=user, **{field: x}) for x in added],
+        ignore_conflicts=True,
+    )
+    if model is ShoppingCart:
+        shopping_lists.add_recipes(user, added)
+    changelog.record_many(KINDS[model], added, user_id=user.pk)
+    changed.send(sender=model, user_id=user.pk)
+    return added
+
+
+@transaction.atomic
+def remove(model, user: User, object_ids: Iterable[int]) -> list[int]:
+    """Удаляет связи пользователя с object_ids.
+
+    Возвращает id объектов, связи с которыми были и удалены.
+    """
+    field = TARGET_FIELDS[model]
+    _lock(user)
+
+    rows = list(model.objects.filter(
+        user=user, **{f'{field}__in': list(object_ids)},
+    ).values_list('pk', field))
+    if not rows:
+        return []
+
+    # QuerySet.delete() из-за подключенных к post_delete сигналов загрузил
+    # бы объекты и писал журнал по строке. _raw_delete - один
+    # DELETE ... WHERE id IN (...); на связи ничего не ссылается
+    query = model.objects.filter(pk__in=[pk for pk, _ in rows])
+    query._raw_delete(query.db)
+
+    removed = [x for _, x in rows]
+    if model is ShoppingCart:
+        shopping_lists.remove_recipes(user, removed)
+    changelog.record_many(
+        KINDS[model], removed, user_id=user.pk, deleted=True)
+    changed.send(sender=model, user_id=user.pk)
+    return removed
+
+
+def _lock(user: User):
+    # Кроме прочего, итоги списка покупок считаются по разнице с тем, что
+    # уже было в корзине
+    list(User.objects.select_for_update().filter(pk=user.pk)
+         .values_list('pk', flat=True))
@@ -0,0 +1,34 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+def fill_shopping_lists(apps, schema_editor):
+    RecipeIngredient = apps.get_model('foodgram', 'RecipeIngredient')
+    ShoppingListItem = apps.get_model('foodgram', 'ShoppingListItem')
+
+    rows = (
+        RecipeIngredient.objects
+        .filter(recipe__recipe_carts__isnull=False)
+        .values('recipe__recipe_carts__user', 'ingredient')
+        .annotate(total=Sum('amount'), count=Count('recipe'))
+        .order_by()
+    )
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(
+            user_id=x['recipe__recipe_carts__user'],
+            ingredient_id=x['ingredient'],
+            total_amount=x['total'],
+            recipe_count=x['count'],
+        )
+        for x in rows
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('foodgram', '0014_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_shopping_lists, migrations.RunPython.noop),
+    ]
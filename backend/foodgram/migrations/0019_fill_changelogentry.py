@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+def fill_changelog(apps, schema_editor):
+    """Начальное состояние журнала: все существующие объекты, чтобы
+    синхронизация с нулевого токена возвращала полный набор данных."""
+    ChangeLogEntry = apps.get_model('foodgram', 'ChangeLogEntry')
+    Recipe = apps.get_model('foodgram', 'Recipe')
+    Favorite = apps.get_model('foodgram', 'Favorite')
+    ShoppingCart = apps.get_model('foodgram', 'ShoppingCart')
+    Subscription = apps.get_model('foodgram', 'Subscription')
+
+    ChangeLogEntry.objects.bulk_create(
+        ChangeLogEntry(kind='recipe', object_id=x)
+        for x in Recipe.objects.order_by('created_at', 'id')
+        .values_list('id', flat=True).iterator()
+    )
+    for model, kind, object_field in (
+        (Favorite, 'favorite', 'recipe_id'),
+        (ShoppingCart, 'shopping_cart', 'recipe_id'),
+        (Subscription, 'subscription', 'subscribed_to_id'),
+    ):
+        rows = model.objects.order_by('created_at', 'id').values_list(
+            'user_id', object_field)
+        ChangeLogEntry.objects.bulk_create(
+            ChangeLogEntry(kind=kind, object_id=object_id, user_id=user_id)
+            for user_id, object_id in rows.iterator()
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('foodgram', '0018_changelogentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_changelog, migrations.RunPython.noop),
+    ]
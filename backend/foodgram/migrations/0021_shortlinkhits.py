@@ -0,0 +1,20 @@
+# Generated by Django 5.2.1 on 2026-10-18 04:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0020_image_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShortLinkHits',
+            fields=[
+                ('code', models.TextField(primary_key=True, serialize=False)),
+                ('hits', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
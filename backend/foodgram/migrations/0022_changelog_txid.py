@@ -0,0 +1,39 @@
+# Generated by Django 5.2.1 on 2026-10-18 05:43
+
+import foodgram.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0021_shortlinkhits'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='changelogentry',
+            options={'ordering': ('txid', 'id')},
+        ),
+        migrations.RemoveIndex(
+            model_name='changelogentry',
+            name='changelog_user_id_idx',
+        ),
+        # Существующие записи получают 0, чтобы выданные до миграции токены
+        # (просто id) остались в силе
+        migrations.AddField(
+            model_name='changelogentry',
+            name='txid',
+            field=models.BigIntegerField(default=0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='changelogentry',
+            name='txid',
+            field=models.BigIntegerField(db_default=foodgram.models.TransactionId(), editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='changelogentry',
+            index=models.Index(fields=['user', 'txid', 'id'], name='changelog_user_txid_idx'),
+        ),
+    ]
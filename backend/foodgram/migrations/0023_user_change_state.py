@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0022_changelog_txid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserChangeState',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('modified_at', models.DateTimeField(default=None, null=True)),
+            ],
+        ),
+    ]
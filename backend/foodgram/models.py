@@ -23,6 +23,9 @@ class User(AbstractUser):
         null=True,
         default=None,
     )
+    # Уменьшенные копии аватара (foodgram.images)
+    avatar_renditions = models.JSONField(default=dict, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -45,6 +48,12 @@ class Subscription(AbstractBaseModel):
 
     class Meta:
         unique_together = ['user', 'subscribed_to']
+        indexes = [
+            models.Index(
+                fields=['user', 'created_at', 'id'],
+                name='subscription_user_cursor_idx',
+            ),
+        ]
 
     def clean(self):
         if self.user == self.subscribed_to:
@@ -54,6 +63,7 @@ class Subscription(AbstractBaseModel):
 class Ingredient(AbstractBaseModel):
     name = models.TextField(max_length=128)
     measurement_unit = models.TextField(max_length=64)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ('name',) + AbstractBaseModel.Meta.ordering
@@ -74,11 +84,24 @@ class Recipe(AbstractBaseModel):
         null=True,
         default=None,
     )
+    # Уменьшенные копии картинки (foodgram.images)
+    image_renditions = models.JSONField(default=dict, editable=False)
     text = models.TextField()
     cooking_time = models.PositiveSmallIntegerField(validators=[
         validators.MinValueValidator(constants.MIN_COOKING_TIME_VALUE),
         validators.MaxValueValidator(constants.MAX_COOKING_TIME_VALUE),
     ])
+    # Обновляется также при изменении ингредиентов рецепта (api.signals)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta(AbstractBaseModel.Meta):
+        indexes = [
+            # Для пагинации по курсору (created_at, id)
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='recipe_cursor_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -129,10 +152,121 @@ class ShoppingCart(AbstractBaseModel):
         unique_together = ['user', 'recipe']
 
 
+class ShoppingListItem(AbstractBaseModel):
+    """Итог по одному ингредиенту в корзине пользователя.
+
+    Поддерживается функциями из foodgram.shopping_lists при каждом изменении
+    корзины или состава рецепта, поэтому список покупок читается одним
+    запросом без пересчёта по всем рецептам корзины.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+    )
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
+    total_amount = models.PositiveIntegerField()
+    recipe_count = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ['user', 'ingredient']
+
+
+class TransactionId(models.Func):
+    """Номер текущей транзакции PostgreSQL как bigint (см. foodgram.changelog).
+    В SQLite запись в базу последовательна, и номер не нужен."""
+
+    arity = 0
+    output_field = models.BigIntegerField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return '0', []
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return '(pg_current_xact_id()::text::bigint)', []
+
+
+class ChangeLogEntry(AbstractBaseModel):
+    """Запись журнала изменений для инкрементальной синхронизации клиентов.
+
+    Журнал только дополняется (см. foodgram.changelog). Удаление объекта
+    записывается как запись с deleted=True. Изменения рецептов общие
+    (user пустой), изменения избранного, корзины и подписок видны только
+    своему пользователю.
+    """
+
+    class Kind(models.TextChoices):
+        RECIPE = 'recipe'
+        FAVORITE = 'favorite'
+        SHOPPING_CART = 'shopping_cart'
+        SUBSCRIPTION = 'subscription'
+
+    kind = models.CharField(max_length=16, choices=Kind.choices)
+    # id рецепта, для подписок - id автора
+    object_id = models.BigIntegerField()
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        default=None,
+        related_name='+',
+    )
+    deleted = models.BooleanField(default=False)
+    # Транзакция, которая добавила запись: журнал читается в порядке
+    # (txid, id), а не просто id
+    txid = models.BigIntegerField(db_default=TransactionId(), editable=False)
+
+    class Meta:
+        ordering = ('txid', 'id')
+        indexes = [
+            models.Index(
+                fields=['user', 'txid', 'id'], name='changelog_user_txid_idx'),
+        ]
+
+
+class ChangeLogHorizon(AbstractBaseModel):
+    """Граница очистки журнала изменений: записи до (txid, last_id)
+    включительно удалены командой prune_changelog. Клиент с токеном
+    раньше границы должен синхронизироваться заново (foodgram.changelog).
+    """
+
+    txid = models.BigIntegerField()
+    last_id = models.BigIntegerField()
+
+
+class UserChangeState(models.Model):
+    """Версия и время последнего изменения избранного, корзины и подписок
+    пользователя. Сдвигаются с каждой записью о нём в журнале изменений
+    (foodgram.changelog) и входят в ETag ответов (api.conditional).
+
+    Отдельная таблица, а не поля User: полное сохранение устаревшего
+    объекта пользователя (например, из кэша аутентификации) вернуло бы
+    версию назад.
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+    )
+    version = models.PositiveBigIntegerField(default=0)
+    modified_at = models.DateTimeField(null=True, default=None)
+
+
 def random_id():
+    # Только для старых ссылок, новые коды не хранятся (api.short_codes)
     return ''.join(random.choices(string.ascii_letters + string.digits, k=3))
 
 
 class ShortLink(AbstractBaseModel):
     short_link = models.TextField(primary_key=True, default=random_id)
     destination = models.TextField(unique=True)
+
+
+class ShortLinkHits(models.Model):
+    """Число переходов по короткой ссылке (api.short_codes)."""
+
+    code = models.TextField(primary_key=True)
+    hits = models.PositiveBigIntegerField(default=0)
@@ -0,0 +1,191 @@
+"""Инкрементальное обновление таблицы ShoppingListItem.
+
+Все функции должны вызываться в той же транзакции, что и изменение корзины
+или состава рецепта, которое они отражают.
+"""
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .models import (
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingListItem,
+    User,
+)
+
+
+# (user_id, ingredient_id) -> [изменение total_amount, изменение recipe_count]
+Changes = dict[tuple[int, int], list[int]]
+
+
+def add_recipe(user: User, recipe: Recipe):
+    """Рецепт добавлен в корзину пользователя."""
+    add_recipes(user, [recipe.pk])
+
+
+def remove_recipe(user: User, recipe: Recipe):
+    """Рецепт убран из корзины пользователя."""
+    remove_recipes(user, [recipe.pk])
+
+
+def add_recipes(user: User, recipe_ids: list[int]):
+    """Рецепты recipe_ids добавлены в корзину пользователя."""
+    _apply(_recipes_changes(user.pk, recipe_ids, 1))
+
+
+def remove_recipes(user: User, recipe_ids: list[int]):
+    """Рецепты recipe_ids убраны из корзины пользователя."""
+    _apply(_recipes_changes(user.pk, recipe_ids, -1))
+
+
+def remove_recipe_from_all_carts(recipe: Recipe):
+    """Рецепт будет удален и исчезнет из всех корзин.
+
+    Вызывается из pre_delete рецепта (api.signals), то есть в транзакции
+    удаления при любом способе удаления: через API, админку или каскадом
+    вместе с автором.
+    """
+    # Строка рецепта блокируется до конца удаления: добавление в корзину
+    # ждёт её через внешний ключ и не разойдётся с итогами
+    list(Recipe.objects.select_for_update().filter(pk=recipe.pk)
+         .values_list('pk', flat=True))
+    user_ids = list(ShoppingCart.objects.select_for_update().filter(
+        recipe=recipe).values_list('user', flat=True))
+    _apply(_recipe_changes(user_ids, recipe, -1))
+
+
+def update_recipe_ingredients(recipe: Recipe,
+                              old: dict[int, int],
+                              new: dict[int, int]):
+    """Состав рецепта изменился с old на new (ingredient_id -> amount)."""
+    deltas = {}
+    for ingredient_id in old.keys() | new.keys():
+        amount = new.get(ingredient_id, 0) - old.get(ingredient_id, 0)
+        count = (ingredient_id in new) - (ingredient_id in old)
+        if amount or count:
+            deltas[ingredient_id] = (amount, count)
+    if not deltas:
+        return
+
+    changes = {}  # type: Changes
+    for user_id in _cart_user_ids(recipe):
+        for ingredient_id, (amount, count) in deltas.items():
+            changes[(user_id, ingredient_id)] = [amount, count]
+    _apply(changes)
+
+
+def compute(user_ids: list[int] | None = None) -> Changes:
+    """Считает содержимое таблицы с нуля по корзинам."""
+    query = RecipeIngredient.objects.filter(recipe__recipe_carts__isnull=False)
+    if user_ids is not None:
+        query = query.filter(recipe__recipe_carts__user__in=user_ids)
+
+    rows = (
+        query
+        .values('recipe__recipe_carts__user', 'ingredient')
+        .annotate(total=Sum('amount'), count=Count('recipe'))
+        .order_by()
+        .values_list(
+            'recipe__recipe_carts__user', 'ingredient', 'total', 'count')
+    )
+    return {(u, i): [total, count] for u, i, total, count in rows}
+
+
+@transaction.atomic
+def rebuild(user_ids: list[int] | None = None):
+    items = ShoppingListItem.objects.all()
+    if user_ids is not None:
+        items = items.filter(user__in=user_ids)
+    items.delete()
+
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(
+            user_id=user_id,
+            ingredient_id=ingredient_id,
+            total_amount=total,
+            recipe_count=count,
+        )
+        for (user_id, ingredient_id), (total, count)
+        in compute(user_ids).items()
+    )
+
+
+def _cart_user_ids(recipe: Recipe) -> list[int]:
+    return list(ShoppingCart.objects.filter(recipe=recipe)
+                .values_list('user', flat=True))
+
+
+def _recipe_changes(user_ids: list[int],
+                    recipe: Recipe,
+                    sign: int) -> Changes:
+    ingredients = list(RecipeIngredient.objects.filter(recipe=recipe)
+                       .values_list('ingredient', 'amount'))
+    return {
+        (user_id, ingredient_id): [sign * amount, sign]
+        for user_id in user_ids
+        for ingredient_id, amount in ingredients
+    }
+
+
+def _recipes_changes(user_id: int,
+                     recipe_ids: list[int],
+                     sign: int) -> Changes:
+    rows = (
+        RecipeIngredient.objects
+        .filter(recipe__in=recipe_ids)
+        .values('ingredient')
+        .annotate(total=Sum('amount'), count=Count('recipe'))
+        .order_by()
+        .values_list('ingredient', 'total', 'count')
+    )
+    return {
+        (user_id, ingredient_id): [sign * total, sign * count]
+        for ingredient_id, total, count in rows
+    }
+
+
+@transaction.atomic
+def _apply(changes: Changes):
+    if not changes:
+        return
+
+    user_ids = {x[0] for x in changes}
+    ingredient_ids = {x[1] for x in changes}
+    existing = {
+        (x.user_id, x.ingredient_id): x
+        for x in ShoppingListItem.objects.select_for_update().filter(
+            user__in=user_ids, ingredient__in=ingredient_ids)
+    }
+
+    to_create = []
+    to_update = []
+    to_delete = []
+    for (user_id, ingredient_id), (amount, count) in changes.items():
+        item = existing.get((user_id, ingredient_id))
+        if item is None:
+            # Отрицательное изменение без строки возможно только если таблица
+            # рассинхронизирована; это исправит rebuild_shopping_lists
+            if count > 0:
+                to_create.append(ShoppingListItem(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    total_amount=amount,
+                    recipe_count=count,
+                ))
+            continue
+
+        item.total_amount += amount
+        item.recipe_count += count
+        if item.recipe_count <= 0:
+            to_delete.append(item.pk)
+        else:
+            to_update.append(item)
+
+    if to_create:
+        ShoppingListItem.objects.bulk_create(to_create)
+    if to_update:
+        ShoppingListItem.objects.bulk_update(
+            to_update, ['total_amount', 'recipe_count'])
+    if to_delete:
+        ShoppingListItem.objects.filter(pk__in=to_delete).delete()
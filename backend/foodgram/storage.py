@@ -0,0 +1,63 @@
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+import hashlib
+import os
+import tempfile
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, в котором имя файла - SHA-256 его содержимого.
+
+    Из имени, предложенного полем модели, сохраняются только папка и
+    расширение: ``recipes/images/x.png`` -> ``recipes/images/ab/ab12...png``.
+    Повторная загрузка того же файла ничего не пишет на диск, поэтому один
+    файл могут использовать несколько объектов; неиспользуемые файлы удаляет
+    команда collect_media_garbage.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        digest = self.get_digest(content)
+        directory, filename = os.path.split(name)
+        ext = os.path.splitext(filename)[1].lower()
+        name = os.path.join(directory, digest[:2], digest + ext)
+        return super().save(name, content, max_length)
+
+    def get_digest(self, content) -> str:
+        hash = hashlib.sha256()
+        for chunk in content.chunks():
+            hash.update(chunk)
+        return hash.hexdigest()
+
+    def get_available_name(self, name, max_length=None):
+        # Одинаковое имя означает одинаковое содержимое
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            # Обновляем время изменения, чтобы сборщик мусора не удалил
+            # файл, на который вот-вот сошлётся новый объект
+            os.utime(full_path)
+            return name
+
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        # Пишем во временный файл и переименовываем, чтобы одновременная
+        # загрузка того же файла не увидела его недописанным
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return name
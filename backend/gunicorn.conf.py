@@ -0,0 +1,55 @@
+"""Настройки gunicorn: gunicorn -c gunicorn.conf.py
+
+SERVER_PROFILE выбирает точку входа:
+- wsgi (по умолчанию) - backend.wsgi, синхронные воркеры;
+- asgi - backend.asgi под uvicorn и асинхронные представления для чтения
+  (ASYNC_VIEWS, см. api.async_views).
+"""
+import os
+import shutil
+import tempfile
+
+
+profile = os.getenv('SERVER_PROFILE', 'wsgi')
+if profile not in ('wsgi', 'asgi'):
+    raise RuntimeError(f'Unknown SERVER_PROFILE: {profile}')
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+
+# Без CACHE_DIR кэш Django в памяти каждого воркера: сброс кэшей, отзыв
+# токенов и метки записей (foodgram.db_routing) не дошли бы до остальных
+if workers > 1 and not os.getenv('CACHE_DIR'):
+    raise SystemExit(
+        'GUNICORN_WORKERS > 1 requires a shared cache, set CACHE_DIR.')
+
+if profile == 'asgi':
+    wsgi_app = 'backend.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    # Явно заданный ASYNC_VIEWS=0 оставляет синхронные представления
+    os.environ.setdefault('ASYNC_VIEWS', '1')
+else:
+    wsgi_app = 'backend.wsgi:application'
+
+# Воркеры пишут метрики в файлы в общей папке, а /metrics собирает их со
+# всех воркеров (api.metrics)
+metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR',
+    os.path.join(tempfile.gettempdir(), 'foodgram-metrics'))
+
+
+def on_starting(server):
+    # Значения прошлого запуска не должны попасть в счётчики
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_worker_init(worker):
+    # Воркер виден в метриках ещё до первого запроса
+    from api.metrics import update_process_metrics
+    update_process_metrics(force=True)